@@ -0,0 +1,145 @@
+"""
+Catalog version and HTTP response cache for the product endpoints.
+The version lives in the catalog_state table so every app process sees a
+bump from the scraper or importer; each process re-reads it at most every
+CATALOG_VERSION_TTL seconds. Cached responses are keyed on (route, query
+params, version), so a bump makes every older entry unreachable.
+
+In-process indexes register with on_catalog_change() to be rebuilt when a
+bump from another process (e.g. the job worker) is noticed.
+"""
+import os
+import logging
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from dotenv import load_dotenv
+from .database import SessionLocal
+from .models import CatalogState
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_TTL = float(os.getenv("CATALOG_VERSION_TTL", "2"))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "2048"))
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "60"))
+
+_version_lock = threading.Lock()
+_version = (0, 0.0)  # (version, monotonic time it was read)
+_listeners: List[Callable[[int], None]] = []
+
+def on_catalog_change(listener: Callable[[int], None]):
+    """Call listener(version) when another process has bumped the catalog version."""
+    _listeners.append(listener)
+
+def _read_version() -> int:
+    db = SessionLocal()
+    try:
+        version = db.query(CatalogState.version).filter(CatalogState.id == 1).scalar()
+        return version or 0
+    finally:
+        db.close()
+
+def catalog_version() -> int:
+    """Current catalog version, re-read from the database at most every CATALOG_VERSION_TTL seconds."""
+    global _version
+    version, read_at = _version
+    if read_at and time.monotonic() - read_at < CATALOG_VERSION_TTL:
+        return version
+    with _version_lock:
+        previous, read_at = _version
+        version = _read_version()
+        _version = (version, time.monotonic())
+    if read_at and version != previous:
+        for listener in _listeners:
+            try:
+                listener(version)
+            except Exception as e:
+                logger.warning("Catalog change listener failed: %s", e)
+    return version
+
+def bump_catalog_version() -> int:
+    """Increment the catalog version after products were added or changed. Returns the new version."""
+    global _version
+    db = SessionLocal()
+    try:
+        updated = db.query(CatalogState).filter(CatalogState.id == 1).update(
+            {CatalogState.version: CatalogState.version + 1}, synchronize_session=False)
+        if not updated:
+            db.add(CatalogState(id=1, version=1))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another process created the row first
+            db.rollback()
+            db.query(CatalogState).filter(CatalogState.id == 1).update(
+                {CatalogState.version: CatalogState.version + 1}, synchronize_session=False)
+            db.commit()
+        version = db.query(CatalogState.version).filter(CatalogState.id == 1).scalar()
+    finally:
+        db.close()
+    with _version_lock:
+        _version = (version, time.monotonic())
+    catalog_cache.clear()
+    return version
+
+def etag_for(body: bytes) -> str:
+    """Strong ETag: a digest of the exact response bytes."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison for If-None-Match (RFC 9110), as CDNs may add W/
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+class CatalogCache:
+    """LRU of serialized responses: key -> (body, etag, extra headers)."""
+
+    def __init__(self, max_entries: int = CATALOG_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[Tuple[bytes, str, Dict[str, str]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple, body: bytes, headers: Dict[str, str] = None) -> Tuple[bytes, str, Dict[str, str]]:
+        entry = (body, etag_for(body), headers or {})
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,163 @@
+"""
+Query embedding cache.
+Two tiers: an in-process LRU and a SQLite file (float32 blobs) that survives restarts.
+Entries are keyed by model name and normalized text. If the SQLite file
+fails (locked, corrupt or read-only), the cache logs it and keeps going in memory.
+"""
+import os
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Awaitable, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share an entry."""
+    return " ".join(text.lower().split())
+
+class EmbeddingCache:
+    def __init__(self, path: Optional[str] = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        # Guards the SQLite connection, so memory hits never wait on disk I/O
+        self._disk_lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.path = path
+        self._conn = None
+        self._conn_pid = None
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """The SQLite file, opened on first use in each process (connections must not cross a fork)."""
+        if not self.path:
+            return None
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text))"
+            )
+            self._conn.commit()
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _disable_disk(self, error: sqlite3.Error):
+        """Fall back to the in-process tier after a SQLite error (locked, corrupt or read-only file)."""
+        logger.warning("Embedding cache file %s failed, continuing in memory only: %s", self.path, error)
+        self.path = None
+        if self._conn is not None and self._conn_pid == os.getpid():
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+        self._conn = None
+
+    def _remember(self, key, vector: List[float]):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _get_memory(self, key) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+            return vector
+
+    def _get_disk(self, key) -> Optional[List[float]]:
+        """Look key up in the SQLite file (counting a miss if it is not there)."""
+        vector = None
+        with self._disk_lock:
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND text = ?", key
+                ).fetchone() if conn is not None else None
+            except sqlite3.Error as e:
+                self._disable_disk(e)
+                row = None
+            if row is not None:
+                vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+            else:
+                self._remember(key, vector)
+                self.disk_hits += 1
+        return vector
+
+    def _put_disk(self, key, vector: List[float]):
+        with self._disk_lock:
+            try:
+                conn = self._connection()
+                if conn is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO embeddings (model, text, vector) VALUES (?, ?, ?)",
+                        (key[0], key[1], np.asarray(vector, dtype=np.float32).tobytes())
+                    )
+                    conn.commit()
+            except sqlite3.Error as e:
+                self._disable_disk(e)
+
+    def _put_memory(self, text: str, model: str, vector: List[float]):
+        key = (model, normalize_text(text))
+        vector = [float(x) for x in vector]
+        with self._lock:
+            self._remember(key, vector)
+        return key, vector
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        key = (model, normalize_text(text))
+        vector = self._get_memory(key)
+        return vector if vector is not None else self._get_disk(key)
+
+    def put(self, text: str, model: str, vector: List[float]):
+        self._put_disk(*self._put_memory(text, model, vector))
+
+    def get_or_compute(self, text: str, model: str, embed: Callable[[str], List[float]]) -> List[float]:
+        vector = self.get(text, model)
+        if vector is None:
+            vector = embed(text)
+            self.put(text, model, vector)
+        return vector
+
+    async def aget_or_compute(self, text: str, model: str,
+                              embed: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+        """Async get_or_compute; the SQLite tier runs in a worker thread, off the event loop."""
+        key = (model, normalize_text(text))
+        vector = self._get_memory(key)
+        if vector is None:
+            vector = await asyncio.to_thread(self._get_disk, key)
+        if vector is None:
+            vector = await embed(text)
+            await asyncio.to_thread(self._put_disk, *self._put_memory(text, model, vector))
+        return vector
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / total if total else 0.0,
+            "memory_entries": len(self._lru),
+        }
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,270 @@
+"""
+Embedding providers.
+
+EMBEDDING_PROVIDER selects where vectors come from, for indexing and for
+queries alike:
+  "openai" - the OpenAI embeddings API (default)
+  "local"  - a sentence-embedding model on the CPU, no network calls:
+             EMBEDDING_LOCAL_BACKEND="onnx" runs an (int8-quantized) ONNX
+             export with onnxruntime, "sentence-transformers" runs the
+             PyTorch model (int8 dynamic quantization with EMBEDDING_QUANTIZE)
+Local query embeddings go through a micro-batcher: concurrent requests that
+arrive within EMBEDDING_BATCH_WAIT_MS are encoded as one batch on a thread
+pool. The vector dimension must match EMBEDDING_DIM (384 for MiniLM), and
+switching providers means re-embedding the catalog. Model libraries and
+the openai package are imported when a provider is first used.
+"""
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+from .models import EMBEDDING_DIM
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+# Hugging Face model id or a local directory (offline builds)
+EMBEDDING_LOCAL_MODEL = os.getenv("EMBEDDING_LOCAL_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_LOCAL_BACKEND = os.getenv("EMBEDDING_LOCAL_BACKEND", "onnx")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "true").lower() == "true"
+EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", "256"))
+# Micro-batching of local query embeddings
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "2"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "2"))
+
+class EmbeddingProvider:
+    """Turns texts into vectors. `model` names the vector space (cache keys, logs)."""
+
+    model = ""
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, text)
+
+    def warm(self):
+        """Load clients or models up front (startup warm-up) instead of on the first query."""
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, model: str = OPENAI_EMBEDDING_MODEL):
+        self.model = model
+        self._async_client = None
+
+    @staticmethod
+    def _openai():
+        # Imported on first use: the package is slow to import
+        import openai
+        return openai
+
+    def warm(self):
+        self._openai()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self._openai().embeddings.create(input=texts, model=self.model)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed_query(self, text: str) -> List[float]:
+        response = self._openai().embeddings.create(input=text, model=self.model)
+        return response.data[0].embedding
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self._async_client is None:
+            self._async_client = self._openai().AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        response = await self._async_client.embeddings.create(input=text, model=self.model)
+        return response.data[0].embedding
+
+class MicroBatcher:
+    """
+    Collects single texts from concurrent callers into batches for embed().
+    A batch is sent when it reaches max_batch or wait_ms after its first
+    text arrived; batches run on a thread pool of `threads` workers.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], List[List[float]]],
+                 max_batch: int = EMBEDDING_MAX_BATCH, wait_ms: float = EMBEDDING_BATCH_WAIT_MS,
+                 threads: int = EMBEDDING_THREADS):
+        self.embed = embed
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="embed")
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+
+    def submit(self, text: str) -> Future:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, daemon=True, name="embed-batcher")
+                self._thread.start()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch):
+        try:
+            vectors = self.embed([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self.batches += 1
+            self.texts += len(batch)
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+        }
+
+def _model_dir(model: str, files: List[str]) -> str:
+    """Local directory for a model, downloading the needed files once if given a hub id."""
+    if os.path.isdir(model):
+        return model
+    from huggingface_hub import snapshot_download
+    return snapshot_download(model, allow_patterns=files)
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """CPU sentence embeddings (mean pooled, L2-normalized); the model loads on first use."""
+
+    def __init__(self, model: str = EMBEDDING_LOCAL_MODEL, backend: str = EMBEDDING_LOCAL_BACKEND,
+                 quantize: bool = EMBEDDING_QUANTIZE, threads: int = EMBEDDING_THREADS):
+        self.model = model
+        self.backend = backend
+        self.quantize = quantize
+        self.threads = threads
+        self._encoder = None
+        self._load_lock = threading.Lock()
+        self.batcher = MicroBatcher(self.embed, threads=threads)
+
+    def _load_onnx(self):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise RuntimeError("onnxruntime and tokenizers are required for EMBEDDING_LOCAL_BACKEND=onnx")
+        path = _model_dir(self.model, [EMBEDDING_ONNX_FILE, "tokenizer.json"])
+        tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=EMBEDDING_MAX_LENGTH)
+        tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        session = onnxruntime.InferenceSession(os.path.join(path, EMBEDDING_ONNX_FILE), options,
+                                               providers=["CPUExecutionProvider"])
+        inputs = {i.name for i in session.get_inputs()}
+
+        def encode(texts: List[str]) -> np.ndarray:
+            encodings = tokenizer.encode_batch(texts)
+            feed = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            }
+            if "token_type_ids" in inputs:
+                feed["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            tokens = session.run(None, feed)[0]
+            mask = feed["attention_mask"][..., None].astype(np.float32)
+            return (tokens * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+        return encode
+
+    def _load_sentence_transformers(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise RuntimeError("sentence-transformers is required for "
+                               "EMBEDDING_LOCAL_BACKEND=sentence-transformers")
+        model = SentenceTransformer(self.model, device="cpu")
+        model.max_seq_length = EMBEDDING_MAX_LENGTH
+        if self.quantize:
+            import torch
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        def encode(texts: List[str]) -> np.ndarray:
+            return model.encode(texts, batch_size=EMBEDDING_MAX_BATCH, convert_to_numpy=True)
+
+        return encode
+
+    def _get_encoder(self):
+        with self._load_lock:
+            if self._encoder is None:
+                if self.backend == "onnx":
+                    self._encoder = self._load_onnx()
+                elif self.backend == "sentence-transformers":
+                    self._encoder = self._load_sentence_transformers()
+                else:
+                    raise ValueError(f"Unknown EMBEDDING_LOCAL_BACKEND: {self.backend}")
+                logger.info("Loaded local embedding model %s (%s)", self.model, self.backend)
+        return self._encoder
+
+    def warm(self):
+        self._get_encoder()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = np.asarray(self._get_encoder()(texts), dtype=np.float32)
+        if vectors.shape[1] != EMBEDDING_DIM:
+            raise ValueError(f"{self.model} produces {vectors.shape[1]}-d vectors but EMBEDDING_DIM={EMBEDDING_DIM}")
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.batcher.submit(text))
+
+PROVIDERS = {
+    "openai": OpenAIEmbeddingProvider,
+    "local": LocalEmbeddingProvider,
+}
+
+def create_embedding_provider(name: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER: {name}")
+    return PROVIDERS[name]()
+
+_provider: Optional[EmbeddingProvider] = None
+
+def get_embedding_provider() -> EmbeddingProvider:
+    global _provider
+    if _provider is None:
+        _provider = create_embedding_provider()
+    return _provider
+
+def set_embedding_provider(provider: EmbeddingProvider):
+    """Swap the provider (benchmarks, tests, one-off re-embedding scripts)."""
+    global _provider
+    _provider = provider
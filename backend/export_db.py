@@ -1,55 +1,137 @@
 """
 Database Export Script
-Exports PostgreSQL data and ChromaDB to files for migration
+Exports products (with their embeddings) to files for migration
+
+The export is a directory of chunked parts written while rows stream from
+a server-side cursor, so memory stays constant:
+  products-00000.jsonl.zst   product rows, JSON Lines (gzip without zstandard)
+  embeddings-00000.npy       float32 block of that part's embeddings
+  manifest.json              parts, row counts, compression, embedding dim
+The import reads the manifest and memory-maps the embedding blocks. ChromaDB
+is rebuilt from the embeddings on import instead of copying chroma_db.
 """
+import gzip
+import io
 import json
 import os
+import logging
+import shutil
+import sys
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import undefer
 from backend.database import SessionLocal
 from backend.models import Product
-import shutil
 
-def export_database():
-    """Export all products to JSON file"""
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip is used without it
+    zstandard = None
+
+EXPORT_PATH = os.getenv("EXPORT_PATH", "products_export")
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "10000"))
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+def _open_part(path: str, compression: str):
+    if compression == "zstd":
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, 'wb')), encoding='utf-8')
+    return gzip.open(path, 'wt', encoding='utf-8')
+
+def open_part_for_reading(path: str, compression: str):
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this export (pip install zstandard)")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb')), encoding='utf-8')
+    return gzip.open(path, 'rt', encoding='utf-8')
+
+def _row(p: Product) -> dict:
+    return {
+        'id': p.id,
+        'title': p.title,
+        'price': p.price,
+        'description': p.description,
+        'image_url': p.image_url,
+        'category': p.category,
+        'product_url': p.product_url,
+        'features': p.features
+    }
+
+def _write_part(path: str, index: int, rows: list, embeddings: list, compression: str) -> dict:
+    suffix = "zst" if compression == "zstd" else "gz"
+    part = {"rows": f"products-{index:05d}.jsonl.{suffix}", "count": len(rows), "embeddings": None}
+    with _open_part(os.path.join(path, part["rows"]), compression) as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+    if embeddings:
+        part["embeddings"] = f"embeddings-{index:05d}.npy"
+        np.save(os.path.join(path, part["embeddings"]), np.asarray(embeddings, dtype=np.float32))
+    return part
+
+def export_database(path: str = EXPORT_PATH, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Export all products and embeddings as a chunked, compressed snapshot"""
+    compression = "zstd" if zstandard is not None else "gzip"
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
     db = SessionLocal()
-    
     try:
-        # Get all products
-        products = db.query(Product).all()
-        
-        # Convert to dict
-        products_data = []
-        for p in products:
-            products_data.append({
-                'id': p.id,
-                'title': p.title,
-                'price': p.price,
-                'description': p.description,
-                'image_url': p.image_url,
-                'category': p.category,
-                'product_url': p.product_url,
-                'features': p.features
-            })
-        
-        # Save to JSON
-        with open('products_backup.json', 'w', encoding='utf-8') as f:
-            json.dump(products_data, f, indent=2, ensure_ascii=False)
-        
-        print(f"✅ Exported {len(products_data)} products to products_backup.json")
-        
-        # Copy ChromaDB folder
-        if os.path.exists('chroma_db'):
-            if os.path.exists('chroma_db_backup'):
-                shutil.rmtree('chroma_db_backup')
-            shutil.copytree('chroma_db', 'chroma_db_backup')
-            print(f"✅ Backed up ChromaDB to chroma_db_backup/")
-        
-        print("\n📦 Backup complete!")
-        print("Files created:")
-        print("  - products_backup.json (PostgreSQL data)")
-        print("  - chroma_db_backup/ (Vector embeddings)")
-        
+        # One read-only transaction, so every part comes from the same snapshot
+        if db.get_bind().dialect.name == "postgresql":
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+        parts, rows, embeddings = [], [], []
+        dim, total = None, 0
+        query = (select(Product).options(undefer(Product.embedding)).order_by(Product.id)
+                 .execution_options(yield_per=chunk_size))
+        for p in db.scalars(query):
+            row = _row(p)
+            if p.embedding:
+                dim = dim or len(p.embedding)
+                row['embedding_row'] = len(embeddings)
+                embeddings.append(p.embedding)
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                parts.append(_write_part(tmp_path, len(parts), rows, embeddings, compression))
+                total += len(rows)
+                logger.info("✅ Exported %s products...", total)
+                # yield_per keeps only weak references, so exported rows are released
+                rows, embeddings = [], []
+        if rows:
+            parts.append(_write_part(tmp_path, len(parts), rows, embeddings, compression))
+            total += len(rows)
+        db.commit()
     finally:
         db.close()
 
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "compression": compression,
+        "count": total,
+        "embedding_dim": dim,
+        "embedding_dtype": "float32",
+        "parts": parts,
+    }
+    with open(os.path.join(tmp_path, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap in the finished export so a reader never sees a partial one
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+    logger.info("✅ Exported %s products to %s/ (%s parts, %s)", total, path, len(parts), compression)
+    logger.info("📦 Backup complete!")
+    logger.info("Import it with IMPORT_BACKUP_PATH=%s", path)
+
 if __name__ == "__main__":
-    export_database()
+    from backend.observability import configure_logging
+    configure_logging()
+    export_database(sys.argv[1] if len(sys.argv) > 1 else EXPORT_PATH)
@@ -0,0 +1,81 @@
+"""
+Fusion of ranked vector and keyword results.
+Each leg is a list of (product_id, raw_score) pairs, best first. Vector raw
+scores are distances (lower is better), keyword raw scores are BM25 (higher
+is better).
+"""
+import os
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "rrf" (reciprocal-rank fusion) or "weighted" (min-max normalized score sum)
+FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf")
+RRF_K = int(os.getenv("RRF_K", "60"))
+VECTOR_WEIGHT = float(os.getenv("VECTOR_WEIGHT", "1.0"))
+KEYWORD_WEIGHT = float(os.getenv("KEYWORD_WEIGHT", "1.0"))
+
+def _candidate(candidates: Dict[int, Dict], product_id: int) -> Dict:
+    if product_id not in candidates:
+        candidates[product_id] = {
+            "id": product_id,
+            "score": 0.0,
+            "vector_rank": None,
+            "vector_distance": None,
+            "keyword_rank": None,
+            "keyword_score": None,
+        }
+    return candidates[product_id]
+
+def _annotate(vector_hits, keyword_hits) -> Dict[int, Dict]:
+    candidates = {}
+    for rank, (product_id, distance) in enumerate(vector_hits, 1):
+        c = _candidate(candidates, product_id)
+        c["vector_rank"], c["vector_distance"] = rank, distance
+    for rank, (product_id, score) in enumerate(keyword_hits, 1):
+        c = _candidate(candidates, product_id)
+        c["keyword_rank"], c["keyword_score"] = rank, score
+    return candidates
+
+def reciprocal_rank_fusion(vector_hits: List[Tuple[int, float]], keyword_hits: List[Tuple[int, float]],
+                           k: int = RRF_K, vector_weight: float = VECTOR_WEIGHT,
+                           keyword_weight: float = KEYWORD_WEIGHT) -> List[Dict]:
+    """score = sum over legs of weight / (k + rank)."""
+    candidates = _annotate(vector_hits, keyword_hits)
+    for c in candidates.values():
+        if c["vector_rank"] is not None:
+            c["score"] += vector_weight / (k + c["vector_rank"])
+        if c["keyword_rank"] is not None:
+            c["score"] += keyword_weight / (k + c["keyword_rank"])
+    return sorted(candidates.values(), key=lambda c: c["score"], reverse=True)
+
+def _min_max(values: Dict[int, float], invert: bool = False) -> Dict[int, float]:
+    if not values:
+        return {}
+    lo, hi = min(values.values()), max(values.values())
+    if hi == lo:
+        return {product_id: 1.0 for product_id in values}
+    scaled = {product_id: (v - lo) / (hi - lo) for product_id, v in values.items()}
+    if invert:
+        scaled = {product_id: 1.0 - v for product_id, v in scaled.items()}
+    return scaled
+
+def weighted_score_fusion(vector_hits: List[Tuple[int, float]], keyword_hits: List[Tuple[int, float]],
+                          vector_weight: float = VECTOR_WEIGHT,
+                          keyword_weight: float = KEYWORD_WEIGHT) -> List[Dict]:
+    """score = weighted sum of min-max normalized leg scores (distances inverted)."""
+    candidates = _annotate(vector_hits, keyword_hits)
+    vector_scores = _min_max(dict(vector_hits), invert=True)
+    keyword_scores = _min_max(dict(keyword_hits))
+    for product_id, c in candidates.items():
+        c["score"] = (vector_weight * vector_scores.get(product_id, 0.0)
+                      + keyword_weight * keyword_scores.get(product_id, 0.0))
+    return sorted(candidates.values(), key=lambda c: c["score"], reverse=True)
+
+def fuse(vector_hits: List[Tuple[int, float]], keyword_hits: List[Tuple[int, float]],
+         method: str = FUSION_METHOD) -> List[Dict]:
+    """Fuse both legs into scored candidates, best first."""
+    if method == "weighted":
+        return weighted_score_fusion(vector_hits, keyword_hits)
+    return reciprocal_rank_fusion(vector_hits, keyword_hits)
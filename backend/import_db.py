@@ -1,74 +1,204 @@
 """
 Database Import Script
 Imports products from JSON backup (no API calls needed!)
+
+The backup is stream-parsed (an export_db directory, a JSON array via
+ijson, or JSON Lines), so large catalogs are never fully loaded. Rows are
+inserted in executemany chunks inside a single transaction, then embedded
+and indexed in chunks.
+Embeddings stored in the backup are reused, so a full restore makes no
+embedding calls. Progress of the indexing phase is checkpointed to
+<backup>.checkpoint, and re-running the import resumes from it.
 """
 import json
 import os
+import logging
+from typing import Callable, Dict, Iterator, List, Optional
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import undefer
 from backend.database import SessionLocal
-from backend.models import Product
+from backend.models import Product, USE_PGVECTOR, EMBEDDING_DIM
 from backend.vector_store import add_products_to_vector_db
+from backend.response_cache import response_cache
+from backend.keyword_index import keyword_index
+from backend.catalog import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+try:
+    import ijson
+except ImportError:  # optional: without it a JSON array backup is loaded in one go
+    ijson = None
+
+BACKUP_PATH = os.getenv("IMPORT_BACKUP_PATH", "products_backup.json")
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
 
-def import_database():
-    """Import products from JSON backup"""
-    
-    if not os.path.exists('products_backup.json'):
-        print("❌ products_backup.json not found!")
-        print("Run export_db.py first on your local machine")
+PRODUCT_FIELDS = ("title", "price", "description", "image_url", "category", "product_url", "features")
+
+def iter_export(path: str) -> Iterator[Dict]:
+    """Yield product dicts from an export_db directory, embeddings memory-mapped."""
+    from backend.export_db import MANIFEST, open_part_for_reading
+    with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+        manifest = json.load(f)
+    for part in manifest["parts"]:
+        embeddings = None
+        if part["embeddings"]:
+            embeddings = np.load(os.path.join(path, part["embeddings"]), mmap_mode='r')
+        with open_part_for_reading(os.path.join(path, part["rows"]), manifest["compression"]) as f:
+            for line in f:
+                data = json.loads(line)
+                if embeddings is not None and data.get('embedding_row') is not None:
+                    data['embedding'] = embeddings[data['embedding_row']]
+                yield data
+
+def iter_backup(path: str) -> Iterator[Dict]:
+    """Yield product dicts from an export directory, a JSON array or a JSON Lines backup."""
+    if os.path.isdir(path):
+        yield from iter_export(path)
         return
-    
+    with open(path, 'rb') as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first != b'[':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif ijson is not None:
+            # use_float: prices and embeddings as float instead of Decimal
+            yield from ijson.items(f, 'item', use_float=True)
+        else:
+            logger.warning("⚠️  ijson not installed, loading the whole backup into memory")
+            yield from json.load(f)
+
+def _chunks(items: Iterator, size: int) -> Iterator[List]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _row(data: Dict, reuse_embeddings: bool) -> Dict:
+    row = {field: data.get(field) for field in PRODUCT_FIELDS}
+    embedding = data.get('embedding') if reuse_embeddings else None
+    # Embeddings from a different model/dimension are recomputed
+    if embedding is not None and len(embedding) == EMBEDDING_DIM:
+        row['embedding'] = [float(x) for x in embedding]
+        if USE_PGVECTOR:
+            row['embedding_vector'] = row['embedding']
+    return row
+
+def _insert_rows(path: str, chunk_size: int, reuse_embeddings: bool) -> List[int]:
+    """Insert products with new URLs in one transaction. Returns the new ids."""
     db = SessionLocal()
-    
+    ids = []
     try:
-        # Load JSON
-        with open('products_backup.json', 'r', encoding='utf-8') as f:
-            products_data = json.load(f)
-        
-        print(f"📥 Importing {len(products_data)} products...")
-        
-        # Clear existing products (optional)
-        # db.query(Product).delete()
-        
-        # Import each product
-        imported_products = []
-        for data in products_data:
-            # Create product
-            product = Product(
-                title=data['title'],
-                price=data['price'],
-                description=data['description'],
-                image_url=data['image_url'],
-                category=data['category'],
-                product_url=data['product_url'],
-                features=data['features']
-            )
-            
-            db.add(product)
-            db.commit()
-            db.refresh(product)
-            
-            # Collect for batch vector DB insert
-            imported_products.append({
-                "id": product.id,
-                "title": product.title,
-                "description": product.description,
-                "price": product.price,
-                "category": product.category
-            })
-            print(f"✅ Imported: {product.title}")
-        
-        # Add all products to vector DB in batch
+        for chunk in _chunks(iter_backup(path), chunk_size):
+            rows = {}
+            for data in chunk:
+                rows.setdefault(data['product_url'], _row(data, reuse_embeddings))
+            existing = {url for (url,) in db.query(Product.product_url).filter(Product.product_url.in_(list(rows)))}
+            rows = [row for url, row in rows.items() if url not in existing]
+            if not rows:
+                continue
+            # executemany; SQLAlchemy batches it into multi-row INSERT ... RETURNING
+            ids.extend(db.scalars(insert(Product).returning(Product.id), rows).all())
+            logger.info("📥 Inserted %s products...", len(ids))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return ids
+
+def _index_rows(ids: List[int]):
+    """Embed (where needed) and index one chunk of imported products."""
+    db = SessionLocal()
+    try:
+        products = [
+            {
+                "id": p.id,
+                "title": p.title,
+                "description": p.description,
+                "price": p.price,
+                "category": p.category,
+                "features": p.features,
+                "embedding": p.embedding
+            }
+            for p in db.query(Product).options(undefer(Product.embedding)).filter(Product.id.in_(ids))
+        ]
+    finally:
+        db.close()
+    keyword_index.add_products(products)
+    add_products_to_vector_db(products)
+
+def _save_checkpoint(path: str, ids: List[int], done: int):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"ids": ids, "done": done}, f)
+
+def import_database(path: str = BACKUP_PATH, chunk_size: int = IMPORT_CHUNK_SIZE,
+                    reuse_embeddings: bool = True,
+                    progress: Optional[Callable[[Dict], None]] = None) -> int:
+    """
+    Import products from JSON backup. Returns the number of new products.
+    Raises if the backup is missing or the import fails (rerun to resume).
+    `progress` is called with a dict of counters after each indexed chunk.
+    """
+
+    checkpoint_path = f"{path}.checkpoint"
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        ids, done = checkpoint["ids"], checkpoint["done"]
+        logger.info("↩️  Resuming import: %s/%s products already indexed", done, len(ids))
+    else:
+        if not os.path.exists(path):
+            logger.error("❌ %s not found!", path)
+            logger.info("Run export_db.py first on your local machine")
+            raise FileNotFoundError(path)
         try:
-            add_products_to_vector_db(imported_products)
-            print(f"\n✅ Successfully imported {len(products_data)} products!")
-            print("✅ ChromaDB vectors created")
+            ids = _insert_rows(path, chunk_size, reuse_embeddings)
         except Exception as e:
-            print(f"⚠️  Vector DB error: {e}")
-        
+            logger.error("❌ Error: %s", e)
+            raise
+        done = 0
+        _save_checkpoint(checkpoint_path, ids, done)
+        logger.info("📥 Imported %s new products", len(ids))
+
+    # Embed and index chunk by chunk; embeddings are written to products.embedding
+    # as each chunk finishes, so a rerun only redoes the current chunk
+    resumed_at = done
+    try:
+        for start in range(done, len(ids), chunk_size):
+            _index_rows(ids[start:start + chunk_size])
+            done = min(start + chunk_size, len(ids))
+            _save_checkpoint(checkpoint_path, ids, done)
+            logger.info("✅ Indexed %s/%s products", done, len(ids))
+            if progress:
+                progress({"total": len(ids), "indexed": done})
     except Exception as e:
-        print(f"❌ Error: {e}")
-        db.rollback()
+        logger.warning("⚠️  Vector DB error (rerun the import to resume): %s", e)
+        raise
     finally:
-        db.close()
+        # Only now are the products in the vector store: other processes refresh on
+        # the bump, and new products may outrank anything in the chat answer cache
+        if done > resumed_at:
+            bump_catalog_version()
+        if done:
+            response_cache.clear()
+
+    os.remove(checkpoint_path)
+    logger.info("✅ Successfully imported %s products!", len(ids))
+    logger.info("✅ ChromaDB vectors created")
+    return len(ids)
 
 if __name__ == "__main__":
+    from backend.observability import configure_logging
+    configure_logging()
     import_database()
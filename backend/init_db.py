@@ -1,11 +1,52 @@
+import logging
 from backend.database import engine, Base
-from backend.models import Product
-from sqlalchemy import text
+from backend.models import Product, Job, USE_PGVECTOR
+from sqlalchemy import text, inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+def add_missing_columns(table=Product.__table__):
+    """
+    create_all does not alter existing tables, so add any model column the
+    table is missing (nullable columns only, e.g. the re-scrape bookkeeping).
+    """
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    missing = [c for c in table.columns if c.name not in existing and c.nullable]
+    if not missing:
+        return
+    with engine.begin() as conn:
+        for c in missing:
+            column_type = c.type.compile(dialect=engine.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {c.name} {column_type}'))
+    logger.info("Added columns to %s: %s", table.name, ', '.join((c.name for c in missing)))
+
+def add_missing_indexes(table=Job.__table__):
+    """create_all only creates indexes along with a new table, so add any the table is missing."""
+    for index in table.indexes:
+        try:
+            index.create(bind=engine, checkfirst=True)
+        except SQLAlchemyError as e:
+            # e.g. duplicate active scrape jobs from before the unique index existed
+            logger.warning("Could not create index %s: %s", index.name, e)
 
 def init_db():
+    # The vector type must exist before a table using it is created
+    if USE_PGVECTOR:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+
     # Create tables
     Base.metadata.create_all(bind=engine)
-    print("Database tables created.")
+    add_missing_columns()
+    add_missing_indexes()
+    logger.info("Database tables created.")
+
+    if USE_PGVECTOR:
+        from backend.pgvector_store import ensure_pgvector_schema
+        ensure_pgvector_schema(engine)
 
 if __name__ == "__main__":
+    from backend.observability import configure_logging
+    configure_logging()
     init_db()
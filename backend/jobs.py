@@ -0,0 +1,288 @@
+"""
+Background jobs for long ingestion work (scrape, import).
+
+Jobs are rows in the jobs table, so they survive restarts: submit_job()
+inserts a queued job and hands its id to the executor, and the API only
+polls status and progress. JOB_EXECUTOR picks where jobs run:
+  "process"  - a separate worker process owned by the app (default)
+  "thread"   - an in-process single-thread queue (tests, single-process setups)
+  "external" - nothing in the app; run `python -m backend.jobs` as the worker
+A job is claimed with a conditional UPDATE, so each runs once even with
+several app processes. Running jobs send a heartbeat; jobs whose heartbeat
+stops (the process died) are requeued, and a worker process pool broken by
+such a death is replaced. Only one scrape is queued or running at a time,
+enforced by a partial unique index on jobs.kind.
+"""
+import os
+import logging
+import sys
+import time
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import func
+from dotenv import load_dotenv
+from .database import SessionLocal
+from .models import Job, JOB_ACTIVE_STATUSES as ACTIVE_STATUSES, JOB_EXCLUSIVE_KINDS as EXCLUSIVE_KINDS
+from .observability import configure_logging
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JOB_EXECUTOR = os.getenv("JOB_EXECUTOR", "process")
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "15"))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "120"))
+
+# Kinds that change products; the memory-mapped vector index files are rebuilt after them
+CATALOG_KINDS = {"scrape", "import"}
+
+def _run_scrape(params: Dict, progress: Callable[[Dict], None]) -> Dict:
+    from .scraper import scrape_hunnit
+    return {"products_changed": scrape_hunnit(progress=progress, **params)}
+
+def _run_import(params: Dict, progress: Callable[[Dict], None]) -> Dict:
+    from .import_db import import_database
+    return {"products_imported": import_database(progress=progress, **params)}
+
+JOB_HANDLERS = {
+    "scrape": _run_scrape,
+    "import": _run_import,
+}
+
+def _rebuild_index_files():
+    """Rewrite the vector index .npy files (when they are used) so servers map the new catalog."""
+    from .vector_store import VECTOR_BACKEND
+    from .numpy_index import NUMPY_INDEX_PATH, rebuild_files
+    if not NUMPY_INDEX_PATH:
+        return
+    if VECTOR_BACKEND != "numpy" and not os.path.exists(f"{NUMPY_INDEX_PATH}.meta.json"):
+        return
+    try:
+        count = rebuild_files(NUMPY_INDEX_PATH)
+        logger.info("Rebuilt vector index files %s.* with %s vectors", NUMPY_INDEX_PATH, count)
+    except Exception as e:
+        logger.warning("Rebuilding vector index files failed: %s", e)
+
+def job_dict(job: Job) -> Dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "params": job.params,
+        "progress": job.progress,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+def _update(job_id: int, **values):
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id == job_id).update(values, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def _claim(job_id: int) -> Optional[Job]:
+    """Atomically move a queued job to running. None if another worker got it first."""
+    db = SessionLocal()
+    try:
+        claimed = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update(
+            {Job.status: "running", Job.started_at: func.now(), Job.heartbeat_at: func.now()},
+            synchronize_session=False)
+        db.commit()
+        return db.get(Job, job_id) if claimed else None
+    finally:
+        db.close()
+
+def run_job(job_id: int):
+    """Claim and run one job, recording progress, result or error on its row."""
+    job = _claim(job_id)
+    if job is None:
+        return
+    logger.info("Job %s (%s) started", job_id, job.kind)
+
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                _update(job_id, heartbeat_at=func.now())
+            except Exception as e:
+                logger.warning("Job %s heartbeat failed: %s", job_id, e)
+
+    def progress(values: Dict):
+        _update(job_id, progress=values, heartbeat_at=func.now())
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        result = JOB_HANDLERS[job.kind](job.params or {}, progress)
+        if job.kind in CATALOG_KINDS:
+            _rebuild_index_files()
+        _update(job_id, status="succeeded", result=result, finished_at=func.now())
+        logger.info("Job %s (%s) succeeded: %s", job_id, job.kind, result)
+    except Exception as e:
+        _update(job_id, status="failed", error=str(e) or type(e).__name__, finished_at=func.now())
+        logger.warning("Job %s (%s) failed: %s", job_id, job.kind, e)
+    finally:
+        stop.set()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if JOB_EXECUTOR == "thread":
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs")
+            else:
+                # spawn: the worker builds its own DB pool and clients instead of
+                # inheriting the app's sockets
+                _executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=configure_logging)
+        return _executor
+
+def _discard_executor(executor):
+    """Drop a broken executor so the next _get_executor() starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def _job_done(job_id: int, future: Future):
+    """Log a job the executor lost (run_job records its own errors on the row)."""
+    error = future.exception() if not future.cancelled() else None
+    if isinstance(error, BrokenProcessPool):
+        # The worker process died mid-job; requeue_stale_jobs picks the job up again
+        logger.warning("Job %s: worker process died, the job is requeued once its heartbeat goes stale", job_id)
+    elif error is not None:
+        logger.error("Job %s crashed in the executor", job_id, exc_info=error)
+
+def dispatch(job_id: int):
+    """Hand a queued job to the configured executor (no-op for an external worker)."""
+    if JOB_EXECUTOR == "external":
+        return
+    executor = _get_executor()
+    try:
+        future = executor.submit(run_job, job_id)
+    except BrokenProcessPool:
+        logger.warning("Job worker process pool is broken, starting a new one")
+        _discard_executor(executor)
+        future = _get_executor().submit(run_job, job_id)
+    future.add_done_callback(lambda f: _job_done(job_id, f))
+
+def _active_job(db, kind: str) -> Optional[Job]:
+    return db.query(Job).filter(Job.kind == kind, Job.status.in_(ACTIVE_STATUSES)).first()
+
+def submit_job(kind: str, params: Optional[Dict] = None) -> Dict:
+    """
+    Queue a job and dispatch it. For an exclusive kind with a job already
+    queued or running, that job is returned instead of a new one.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    for job_id in requeue_stale_jobs():
+        dispatch(job_id)
+    db = SessionLocal()
+    try:
+        if kind in EXCLUSIVE_KINDS:
+            active = _active_job(db, kind)
+            if active is not None:
+                return job_dict(active)
+        job = Job(kind=kind, status="queued", params=params or {})
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another request queued the same exclusive kind since the check above
+            db.rollback()
+            active = _active_job(db, kind) if kind in EXCLUSIVE_KINDS else None
+            if active is None:
+                raise
+            return job_dict(active)
+        db.refresh(job)
+        result = job_dict(job)
+    finally:
+        db.close()
+    dispatch(result["id"])
+    return result
+
+def get_job(job_id: int) -> Optional[Dict]:
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        return job_dict(job) if job is not None else None
+    finally:
+        db.close()
+
+def list_jobs(limit: int = 20) -> List[Dict]:
+    db = SessionLocal()
+    try:
+        return [job_dict(job) for job in db.query(Job).order_by(Job.id.desc()).limit(limit)]
+    finally:
+        db.close()
+
+def requeue_stale_jobs() -> List[int]:
+    """Requeue running jobs whose heartbeat stopped (their process died). Returns their ids."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOB_STALE_AFTER)
+    db = SessionLocal()
+    try:
+        stale = [job_id for (job_id,) in db.query(Job.id).filter(
+            Job.status == "running", Job.heartbeat_at < cutoff)]
+        if stale:
+            db.query(Job).filter(Job.id.in_(stale), Job.status == "running").update(
+                {Job.status: "queued"}, synchronize_session=False)
+            db.commit()
+        return stale
+    finally:
+        db.close()
+
+def _queued_job_ids() -> List[int]:
+    db = SessionLocal()
+    try:
+        return [job_id for (job_id,) in db.query(Job.id).filter(Job.status == "queued").order_by(Job.id)]
+    finally:
+        db.close()
+
+def resume_jobs():
+    """At startup: requeue jobs interrupted by a restart and dispatch everything queued."""
+    for job_id in requeue_stale_jobs():
+        logger.info("Job %s was interrupted, requeued", job_id)
+    for job_id in _queued_job_ids():
+        dispatch(job_id)
+
+def shutdown_jobs():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def work_forever(poll_interval: float = JOB_POLL_INTERVAL):
+    """Standalone worker loop (JOB_EXECUTOR=external): run queued jobs one at a time."""
+    logger.info("Job worker started")
+    while True:
+        requeue_stale_jobs()
+        job_ids = _queued_job_ids()
+        for job_id in job_ids:
+            run_job(job_id)
+        if not job_ids:
+            time.sleep(poll_interval)
+
+if __name__ == "__main__":
+    configure_logging()
+    # python -m backend.jobs  -> run the standalone job worker
+    if len(sys.argv) > 1 and sys.argv[1] != "worker":
+        print("Usage: python -m backend.jobs [worker]")
+    else:
+        work_forever()
@@ -0,0 +1,188 @@
+"""
+In-process BM25 keyword index over product title, description and features.
+Built from the products table on first use and kept in sync by the scraper
+and importer through add_products().
+"""
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from .models import Product
+from .search_filters import FILTER_FIELDS, matches_filters
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Title terms count this many times, so title matches outrank description matches
+TITLE_WEIGHT = 2
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "our", "show", "some", "that",
+    "the", "this", "to", "want", "with", "you", "your", "need", "looking",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def _strip(word: str, suffixes) -> str:
+    for suffix, replacement in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: len(word) - len(suffix)] + replacement
+    return word
+
+def stem(word: str) -> str:
+    """Light suffix-stripping stemmer: plurals first, then -ing/-ed/-ly."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if not word.endswith(("ss", "us")):
+        if word.endswith(("sses", "shes", "ches", "xes", "zes")):
+            word = word[:-2]
+        else:
+            word = _strip(word, (("ies", "y"), ("s", "")))
+    return _strip(word, (("ing", ""), ("ed", ""), ("ly", "")))
+
+def words(text: str) -> List[str]:
+    """Lowercase alphanumeric words without stopwords (unstemmed)."""
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+def tokenize(text: str) -> List[str]:
+    return [stem(t) for t in words(text)]
+
+def _features_text(features) -> str:
+    if not features:
+        return ""
+    if isinstance(features, dict):
+        return " ".join(f"{k} {v}" for k, v in features.items())
+    if isinstance(features, list):
+        return " ".join(str(f) for f in features)
+    return str(features)
+
+def document_terms(product: Dict) -> Counter:
+    terms = Counter()
+    for term in tokenize(product.get("title")):
+        terms[term] += TITLE_WEIGHT
+    terms.update(tokenize(product.get("description")))
+    terms.update(tokenize(_features_text(product.get("features"))))
+    return terms
+
+class KeywordIndex:
+    def __init__(self):
+        self._postings = {}     # term -> {product_id: term frequency}
+        self._doc_terms = {}    # product_id -> Counter of terms
+        self._doc_len = {}
+        self._attributes = {}   # product_id -> filterable attributes
+        self._total_len = 0
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def _remove(self, product_id: int):
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(product_id)
+        self._attributes.pop(product_id, None)
+
+    def add_products(self, products: List[Dict]):
+        """
+        Insert or replace products in the index.
+        products list should contain dicts with: id, title, description and optionally
+        features plus the filterable attributes (price, category)
+        """
+        filter_attributes = {field for field, _, _ in FILTER_FIELDS.values()}
+        with self._lock:
+            for p in products:
+                product_id = p["id"]
+                self._remove(product_id)
+                terms = document_terms(p)
+                self._doc_terms[product_id] = terms
+                length = sum(terms.values())
+                self._doc_len[product_id] = length
+                self._total_len += length
+                self._attributes[product_id] = {a: p.get(a) for a in filter_attributes}
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[product_id] = tf
+
+    def remove_products(self, product_ids: List[int]):
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+
+    def reset(self):
+        """Forget all products; the next ensure_loaded() rebuilds from the products table."""
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_len = {}
+            self._attributes = {}
+            self._total_len = 0
+            self.loaded = False
+
+    def has_term(self, term: str) -> bool:
+        """Whether any product contains the (stemmed) term."""
+        return term in self._postings
+
+    def categories(self) -> set:
+        with self._lock:
+            return {a["category"] for a in self._attributes.values() if a.get("category")}
+
+    def ensure_loaded(self, db: Session):
+        """Build the index from the products table the first time it is needed."""
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            rows = db.query(
+                Product.id, Product.title, Product.description, Product.features,
+                Product.price, Product.category
+            ).all()
+            self.add_products([dict(r._mapping) for r in rows])
+            self.loaded = True
+            logger.info("Keyword index built with %s products", len(rows))
+
+    def search(self, query_text: str, limit: int = 20,
+               filters: Optional[Dict] = None) -> List[Tuple[int, float]]:
+        """
+        Rank products for query_text with BM25, among products passing filters.
+        Returns (product_id, score) pairs, best first.
+        """
+        query_terms = set(tokenize(query_text))
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not query_terms or n_docs == 0:
+                return []
+            avg_len = self._total_len / n_docs
+            scores = {}
+            allowed = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for product_id, tf in postings.items():
+                    if filters:
+                        if product_id not in allowed:
+                            allowed[product_id] = matches_filters(self._attributes[product_id], filters)
+                        if not allowed[product_id]:
+                            continue
+                    norm = tf + K1 * (1 - B + B * self._doc_len[product_id] / avg_len)
+                    scores[product_id] = scores.get(product_id, 0.0) + idf * tf * (K1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+keyword_index = KeywordIndex()
@@ -1,18 +1,47 @@
-from fastapi import FastAPI, Depends, HTTPException
+import os
+import time
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional
+from datetime import datetime
 from pydantic import BaseModel, validator
+import json
 
-from .database import get_db, engine, Base
+from .database import engine, get_db, pool_status
+from .init_db import init_db
 from .models import Product
-from .scraper import scrape_hunnit
-from .rag import chat_with_products
+from .jobs import submit_job, get_job, list_jobs, resume_jobs, shutdown_jobs
+from .rag import achat_with_products, astream_chat_with_products
+from .warmup import warmup, start_warm_up
+from .catalog import catalog_version, catalog_cache, etag_matches, CATALOG_MAX_AGE
+from .observability import configure_logging, register_collector, render_metrics, HTTP_LATENCY
 
-# Initialize DB tables on startup
-Base.metadata.create_all(bind=engine)
+configure_logging()
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Neusearch AI API")
+# Create missing tables at startup. Off under the preloading server
+# (backend/serve.py), whose master does it once before forking workers
+INIT_DB_ON_STARTUP = os.getenv("INIT_DB_ON_STARTUP", "true").lower() == "true"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if INIT_DB_ON_STARTUP:
+        init_db()
+    try:
+        resume_jobs()
+    except Exception as e:
+        logger.warning("Resuming jobs failed: %s", e)
+    # Clients, indexes and models load in the background; /health/ready tracks it
+    start_warm_up()
+    yield
+    shutdown_jobs()
+
+app = FastAPI(title="Neusearch AI API", lifespan=lifespan)
 
 # CORS - Update allowed origins for production
 ALLOWED_ORIGINS = [
@@ -31,8 +60,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    """Request latency per route template (streaming responses: time to first byte)."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_LATENCY.observe(time.perf_counter() - start, method=request.method,
+                             route=route.path if route is not None else "unmatched", status=status)
+
 class ProductResponse(BaseModel):
     id: int
     title: str
@@ -46,6 +90,18 @@ class ProductResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    params: Optional[dict] = None
+    progress: Optional[dict] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 class ChatRequest(BaseModel):
     query: str
     
@@ -60,16 +116,88 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     products: List[ProductResponse]
+    # OpenAI token counts of the answer; None when it came from the response cache
+    usage: Optional[Dict[str, int]] = None
 
 @app.get("/")
 def read_root():
     return {"message": "Neusearch AI Backend is running"}
 
-@app.post("/scrape")
+@app.get("/health/live")
+def liveness():
+    """The process is up and answering (no dependency checks)."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness(response: Response):
+    """200 once warm-up has finished and the database answers, 503 until then."""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        database = "ok"
+    except Exception as e:
+        database = str(e)
+    ready = warmup.done and database == "ok"
+    response.status_code = 200 if ready else 503
+    return {"status": "ready" if ready else "starting", "database": database, "warmup": warmup.to_dict()}
+
+@app.get("/stats")
+def get_stats():
+    """Connection pool usage and cache hit ratios for this process."""
+    from .embedding_cache import embedding_cache
+    from .response_cache import response_cache
+    from .embeddings import get_embedding_provider
+    provider = get_embedding_provider()
+    return {
+        "db_pool": pool_status(),
+        "embedding_provider": {
+            "model": provider.model,
+            **(provider.batcher.stats() if hasattr(provider, "batcher") else {}),
+        },
+        "embedding_cache": embedding_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "catalog_cache": catalog_cache.stats(),
+    }
+
+def _cache_metrics():
+    from .embedding_cache import embedding_cache
+    from .response_cache import response_cache
+    caches = {
+        "embedding": embedding_cache.stats(),
+        "response": response_cache.stats(),
+        "catalog": catalog_cache.stats(),
+    }
+    hits = {name: stats.get("hits", stats.get("memory_hits", 0) + stats.get("disk_hits", 0))
+            for name, stats in caches.items()}
+    yield ("cache_hits_total", "counter", "Cache hits by cache", [({"cache": name}, value) for name, value in hits.items()])
+    yield ("cache_misses_total", "counter", "Cache misses by cache",
+           [({"cache": name}, stats["misses"]) for name, stats in caches.items()])
+    yield ("cache_hit_ratio", "gauge", "Cache hit ratio by cache",
+           [({"cache": name}, stats["hit_ratio"]) for name, stats in caches.items()])
+
+def _pool_metrics():
+    status = pool_status()
+    for name, field, kind in (("db_pool_checked_out", "checked_out", "gauge"),
+                              ("db_pool_overflow", "overflow", "gauge"),
+                              ("db_pool_checkouts_total", "checkouts", "counter"),
+                              ("db_pool_timeouts_total", "timeouts", "counter"),
+                              ("db_pool_wait_seconds_total", "wait_seconds_total", "counter")):
+        if field in status:
+            yield (name, kind, f"Connection pool {field.replace('_', ' ')}", [({}, status[field])])
+
+register_collector(_cache_metrics)
+register_collector(_pool_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: per-stage and per-route latency histograms, token counts, caches, pool."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.post("/scrape", response_model=JobResponse, status_code=202)
 def trigger_scrape():
+    """Queue a scrape job (or return the one already queued/running); poll GET /jobs/{id}."""
     try:
-        scrape_hunnit()
-        return {"message": "Scraping completed successfully"}
+        return submit_job("scrape")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -77,37 +205,129 @@ def trigger_scrape():
 def initialize_database():
     """Create database tables"""
     try:
-        Base.metadata.create_all(bind=engine)
+        init_db()
         return {"message": "Database tables created successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/import-backup")
+@app.post("/import-backup", response_model=JobResponse, status_code=202)
 def import_backup():
-    """Import products from JSON backup file"""
+    """Queue an import of the backup file; poll GET /jobs/{id}."""
     try:
-        from .import_db import import_database
-        import_database()
-        return {"message": "Database import completed successfully"}
+        return submit_job("import")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/jobs", response_model=List[JobResponse])
+def get_jobs(limit: int = Query(20, ge=1, le=100)):
+    return list_jobs(limit)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job_status(job_id: int):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+PRODUCT_FIELDS = tuple(ProductResponse.model_fields)
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    """Validate a comma-separated `fields` parameter; id is always included."""
+    if not fields:
+        return list(PRODUCT_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in PRODUCT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in dict.fromkeys(requested) if f != "id"]
+
+def _catalog_response(request: Request, build) -> Response:
+    """
+    Serve a product endpoint from the catalog cache, keyed on route, query
+    params and catalog version. build() -> (body bytes, extra headers) runs on
+    a miss. Answers 304 when If-None-Match has the current ETag.
+    """
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())), catalog_version())
+    entry = catalog_cache.get(key)
+    if entry is None:
+        body, headers = build()
+        entry = catalog_cache.put(key, body, headers)
+    body, etag, headers = entry
+    headers = {**headers, "ETag": etag, "Cache-Control": f"public, max-age={CATALOG_MAX_AGE}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/products", response_model=List[ProductResponse])
-def get_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    products = db.query(Product).offset(skip).limit(limit).all()
-    return products
+def get_products(request: Request, skip: int = 0, limit: int = Query(100, ge=1, le=1000),
+                 after: Optional[int] = None, fields: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    List products ordered by id.
+    For the next page pass the X-Next-Cursor response header as `after`
+    (keyset pagination; `skip` still works but gets slower on deep pages).
+    `fields` is a comma-separated subset of the product fields to return.
+    """
+    selected = _parse_fields(fields)
+
+    def build():
+        query = db.query(*[getattr(Product, f) for f in selected]).order_by(Product.id)
+        if after is not None:
+            query = query.filter(Product.id > after)
+        elif skip:
+            query = query.offset(skip)
+        rows = query.limit(limit).all()
+
+        # Plain column rows: no ORM objects or response-model validation per product
+        headers = {"X-Next-Cursor": str(rows[-1].id)} if len(rows) == limit else {}
+        return json.dumps([row._asdict() for row in rows], ensure_ascii=False).encode("utf-8"), headers
+
+    return _catalog_response(request, build)
 
 @app.get("/products/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+def get_product(product_id: int, request: Request, db: Session = Depends(get_db)):
+    def build():
+        product = db.query(Product).filter(Product.id == product_id).first()
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return ProductResponse.model_validate(product, from_attributes=True).model_dump_json().encode("utf-8"), {}
+
+    return _catalog_response(request, build)
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(request: ChatRequest):
+async def chat(request: ChatRequest):
     try:
-        result = chat_with_products(request.query)
+        result = await achat_with_products(request.query)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Server-sent events version of /chat.
+    Emits one `products` event with the recommended products, then `token`
+    events with pieces of the answer, then `done` with the token usage (or `error`).
+    """
+    async def event_stream():
+        try:
+            usage = None
+            async for event, payload in astream_chat_with_products(request.query):
+                if event == "products":
+                    products = [ProductResponse.model_validate(p, from_attributes=True).model_dump() for p in payload]
+                    yield _sse("products", products)
+                elif event == "usage":
+                    usage = payload
+                else:
+                    yield _sse("token", {"content": payload})
+            yield _sse("done", {"usage": usage})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
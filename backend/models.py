@@ -1,8 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, JSON
+import os
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, JSON, Index, and_
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
 from .database import Base
 
+# Native vector column only when the pgvector backend is enabled, since the
+# extension is not available everywhere (see install_pgvector.sql)
+USE_PGVECTOR = os.getenv("VECTOR_BACKEND", "chroma") == "pgvector"
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -15,10 +22,51 @@ class Product(Base):
     category = Column(String, index=True)
     product_url = Column(String, unique=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Incremental re-scrape state (see scraper.py)
+    content_hash = Column(String(64), nullable=True)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    last_seen_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
     
-    
-    # Vector embedding stored as JSON (pgvector not available)
-    embedding = Column(JSON, nullable=True)
+    # Vector embedding stored as JSON (portable; loaded by the NumPy index).
+    # Deferred: only loaded when accessed or with undefer()
+    embedding = deferred(Column(JSON, nullable=True))
+
+    # Same embedding as a native pgvector column (HNSW-indexed, see pgvector_store.py)
+    if USE_PGVECTOR:
+        embedding_vector = deferred(Column(Vector(EMBEDDING_DIM), nullable=True))
+
+class CatalogState(Base):
+    """Single row holding the catalog version, bumped whenever products change (see catalog.py)."""
+    __tablename__ = "catalog_state"
 
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+JOB_ACTIVE_STATUSES = ("queued", "running")
+# Kinds with at most one queued or running job
+JOB_EXCLUSIVE_KINDS = ("scrape",)
+
+class Job(Base):
+    """Background job (scrape or import), run by the job worker in jobs.py."""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, index=True, nullable=False)
+    status = Column(String, index=True, nullable=False, default="queued")  # queued, running, succeeded, failed
+    params = Column(JSON)
+    progress = Column(JSON)
+    result = Column(JSON)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))
 
+# Enforces JOB_EXCLUSIVE_KINDS: a second queued or running job of such a kind fails to insert
+_one_active_job = and_(Job.kind.in_(JOB_EXCLUSIVE_KINDS), Job.status.in_(JOB_ACTIVE_STATUSES))
+Index("uq_jobs_active_exclusive_kind", Job.kind, unique=True,
+      postgresql_where=_one_active_job, sqlite_where=_one_active_job)
@@ -0,0 +1,259 @@
+"""
+In-process vector index: one contiguous float32 matrix of unit-normalized
+product embeddings, searched with a vectorized dot product and argpartition.
+
+Loaded once from products.embedding, or from .npy files written by
+`python -m backend.numpy_index build` (and rewritten by the job worker after
+every scrape or import) which are memory-mapped read-only so every worker
+process shares the same pages. The files are stamped with the catalog
+version they were built at; stale or inconsistent files are ignored in
+favour of products.embedding. Upserts are applied incrementally (a
+memory-mapped index is copied into private memory on the first write).
+"""
+import os
+import logging
+import sys
+import json
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from .models import Product, CatalogState
+from .search_filters import FILTER_FIELDS, normalize_filters
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH", "vector_index")
+
+def _catalog_version(db: Session) -> int:
+    return db.query(CatalogState.version).filter(CatalogState.id == 1).scalar() or 0
+
+def _write_atomic(path: str, write):
+    """Write to a temporary file next to path, then rename it over path."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+class NumpyVectorIndex:
+    def __init__(self):
+        self._set(
+            np.empty(0, dtype=np.int64),
+            np.empty((0, 0), dtype=np.float32),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=object),
+        )
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _set(self, ids, vectors, prices, categories):
+        # One tuple swap, so readers never see arrays of different lengths
+        self._state = (ids, vectors, prices, categories)
+        self._row_of = {int(product_id): row for row, product_id in enumerate(ids)}
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._state[0]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._state[1]
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self._state[2]
+
+    @property
+    def categories(self) -> np.ndarray:
+        return self._state[3]
+
+    def load_from_db(self, db: Session):
+        rows = db.query(Product.id, Product.embedding, Product.price, Product.category).filter(
+            Product.embedding.isnot(None)
+        ).order_by(Product.id).all()
+        rows = [r for r in rows if r.embedding]
+        with self._lock:
+            if rows:
+                vectors = _unit_rows(np.asarray([r.embedding for r in rows], dtype=np.float32))
+            else:
+                vectors = np.empty((0, 0), dtype=np.float32)
+            self._set(
+                np.asarray([r.id for r in rows], dtype=np.int64),
+                vectors,
+                np.asarray([r.price if r.price is not None else np.nan for r in rows], dtype=np.float64),
+                np.asarray([(r.category or "").lower() for r in rows], dtype=object),
+            )
+            self.loaded = True
+        logger.info("Vector index loaded %s embeddings from the database", len(rows))
+
+    def load_files(self, path: str = NUMPY_INDEX_PATH, catalog_version: Optional[int] = None):
+        """
+        Memory-map an index written by save(). Raises ValueError if the files
+        disagree with each other or were built at another catalog version.
+        """
+        with open(f"{path}.meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if catalog_version is not None and meta.get("catalog_version") != catalog_version:
+            raise ValueError(f"built at catalog version {meta.get('catalog_version')}, current is {catalog_version}")
+        ids = np.load(f"{path}.ids.npy")
+        vectors = np.load(f"{path}.vectors.npy", mmap_mode="r")
+        prices = np.load(f"{path}.prices.npy")
+        categories = np.asarray(meta["categories"], dtype=object)
+        lengths = {len(ids), len(vectors), len(prices), len(categories), meta.get("count", len(ids))}
+        if len(lengths) != 1:
+            raise ValueError(f"inconsistent files (lengths {sorted(lengths)})")
+        with self._lock:
+            self._set(ids, vectors, prices, categories)
+            self.loaded = True
+        logger.info("Vector index memory-mapped %s embeddings from %s.vectors.npy", len(self.ids), path)
+
+    def save(self, path: str = NUMPY_INDEX_PATH, catalog_version: int = 0):
+        """Write the .npy files; each is replaced atomically and the metadata (the stamp) goes last."""
+        with self._lock:
+            ids, vectors, prices, categories = self._state
+        _write_atomic(f"{path}.ids.npy", lambda f: np.save(f, ids))
+        _write_atomic(f"{path}.vectors.npy", lambda f: np.save(f, np.ascontiguousarray(vectors)))
+        _write_atomic(f"{path}.prices.npy", lambda f: np.save(f, prices))
+        meta = {"catalog_version": catalog_version, "count": len(ids), "categories": list(categories)}
+        _write_atomic(f"{path}.meta.json", lambda f: f.write(json.dumps(meta).encode("utf-8")))
+
+    def reset(self):
+        """Reload on the next ensure_loaded(); queries keep the old arrays until then."""
+        self.loaded = False
+
+    def ensure_loaded(self, db: Session, path: str = NUMPY_INDEX_PATH):
+        """
+        Load from the .npy files if they match the current catalog version,
+        else from the database. Only the first call does work.
+        """
+        if self.loaded:
+            return
+        if path and os.path.exists(f"{path}.meta.json"):
+            try:
+                self.load_files(path, catalog_version=_catalog_version(db))
+                return
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Ignoring vector index files %s.*: %s", path, e)
+        self.load_from_db(db)
+
+    def add(self, products: List[Dict]):
+        """
+        Insert or replace vectors.
+        products list should contain dicts with: id, embedding, price, category
+        """
+        products = [p for p in products if p.get("embedding")]
+        if not products:
+            return
+        new_vectors = _unit_rows(np.asarray([p["embedding"] for p in products], dtype=np.float32))
+        with self._lock:
+            ids, vectors, prices, categories = self._state
+            if not len(vectors):
+                vectors = np.empty((0, new_vectors.shape[1]), dtype=np.float32)
+            # Private copies (also detaches a memmap); readers keep the old arrays
+            ids, prices, categories = ids.copy(), prices.copy(), categories.copy()
+            vectors = np.array(vectors, dtype=np.float32)
+
+            appended = []
+            for p, vector in zip(products, new_vectors):
+                row = self._row_of.get(int(p["id"]))
+                if row is None:
+                    appended.append((p, vector))
+                    continue
+                vectors[row] = vector
+                prices[row] = p.get("price") if p.get("price") is not None else np.nan
+                categories[row] = (p.get("category") or "").lower()
+
+            if appended:
+                ids = np.concatenate([ids, np.asarray([p["id"] for p, _ in appended], dtype=np.int64)])
+                vectors = np.vstack([vectors, np.stack([v for _, v in appended])])
+                prices = np.concatenate([prices, np.asarray(
+                    [p.get("price") if p.get("price") is not None else np.nan for p, _ in appended], dtype=np.float64)])
+                categories = np.concatenate([categories, np.asarray(
+                    [(p.get("category") or "").lower() for p, _ in appended], dtype=object)])
+
+            self._set(ids, vectors, prices, categories)
+
+    def _mask(self, filters: Dict, categories: np.ndarray, prices: np.ndarray) -> Optional[np.ndarray]:
+        mask = None
+        for name, value in normalize_filters(filters).items():
+            field, op, _ = FILTER_FIELDS[name]
+            if field == "category":
+                condition = categories == value.lower()
+            elif field == "price":
+                with np.errstate(invalid="ignore"):
+                    condition = prices >= value if op == "$gte" else prices <= value
+            else:
+                continue
+            mask = condition if mask is None else mask & condition
+        return mask
+
+    def query(self, query_embedding: List[float], n_results: int = 20,
+              filters: Optional[Dict] = None) -> Dict:
+        """
+        Top-k by cosine similarity among products passing filters.
+        Returns the same shape as a ChromaDB query: {"ids": [[...]], "distances": [[...]]}
+        with cosine distances (1 - similarity).
+        """
+        ids, vectors, prices, categories = self._state
+        if len(ids) == 0:
+            return {"ids": [[]], "distances": [[]]}
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = vectors @ query
+
+        mask = self._mask(filters or {}, categories, prices)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            available = int(mask.sum())
+        else:
+            available = len(scores)
+
+        k = min(n_results, available)
+        if k <= 0:
+            return {"ids": [[]], "distances": [[]]}
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return {
+            "ids": [[str(int(i)) for i in ids[top]]],
+            "distances": [[float(1.0 - s) for s in scores[top]]],
+        }
+
+vector_index = NumpyVectorIndex()
+
+def rebuild_files(path: str = NUMPY_INDEX_PATH) -> int:
+    """Rewrite the .npy files from products.embedding, stamped with the current catalog version."""
+    from .database import SessionLocal
+    index = NumpyVectorIndex()
+    db = SessionLocal()
+    try:
+        # Read the version first: a change while loading leaves the files stamped older, so they are ignored
+        version = _catalog_version(db)
+        index.load_from_db(db)
+    finally:
+        db.close()
+    index.save(path, catalog_version=version)
+    return len(index)
+
+if __name__ == "__main__":
+    from .observability import configure_logging
+    configure_logging()
+    # python -m backend.numpy_index build  -> write the .npy files from products.embedding
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        count = rebuild_files()
+        logger.info("Wrote %s vectors to %s.*.npy", count, NUMPY_INDEX_PATH)
+    else:
+        print("Usage: python -m backend.numpy_index build")
@@ -0,0 +1,148 @@
+"""
+Logging setup, timing spans and Prometheus metrics.
+
+span("stage") times a block, records it in the rag_stage_duration_seconds
+histogram and logs it at DEBUG. Metrics are kept in-process and rendered
+in the Prometheus text format by render_metrics() (served at /metrics);
+values computed on demand (cache hit ratios, pool usage) are added with
+register_collector().
+"""
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+logger = logging.getLogger(__name__)
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Configure logging once (the app, the job worker and the CLI scripts call this)."""
+    level = getattr(logging, level, logging.INFO)
+    # DEBUG applies to this app only; library loggers (SQLAlchemy pool, httpx) stay at INFO
+    logging.basicConfig(level=max(level, logging.INFO), format=LOG_FORMAT)
+    for name in ("backend", "__main__"):
+        logging.getLogger(name).setLevel(level)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"'.replace("\n", " ") for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _label_text(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _label_text(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {series[-1]}")
+        return lines
+
+STAGE_LATENCY = Histogram("rag_stage_duration_seconds", "Time spent in each RAG / search stage", ["stage"])
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route",
+                         ["method", "route", "status"])
+LLM_TOKENS = Counter("llm_tokens_total", "OpenAI tokens used", ["model", "kind"])
+QUERY_ANALYSIS = Counter("query_analysis_total", "Chat query analyses by source (cache, parser, llm, error)",
+                         ["source"])
+
+_metrics = [STAGE_LATENCY, HTTP_LATENCY, LLM_TOKENS, QUERY_ANALYSIS]
+# Each collector returns (name, type, help, [(labels dict, value), ...]) tuples
+_collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict, float]]]]]] = []
+
+def register_collector(collector: Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict, float]]]]]):
+    _collectors.append(collector)
+
+@contextmanager
+def span(stage: str):
+    """Time a stage: histogram observation plus a DEBUG log line."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, stage=stage)
+        logger.debug("span stage=%s duration_ms=%.1f", stage, elapsed * 1000)
+
+def record_usage(model: str, usage):
+    """Count prompt/completion tokens from an OpenAI usage object (ignored if missing)."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, kind="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, kind="completion")
+
+def usage_summary(usage) -> Optional[Dict[str, int]]:
+    """Token counts of one OpenAI call, for returning with the response."""
+    if usage is None:
+        return None
+    return {kind: getattr(usage, kind, 0) or 0 for kind in ("prompt_tokens", "completion_tokens", "total_tokens")}
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = list(collector())
+        except Exception as e:
+            logger.warning("Metrics collector failed: %s", e)
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_label_text(list(labels), list(labels.values()))} {value}")
+    return "\n".join(lines) + "\n"
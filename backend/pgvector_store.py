@@ -0,0 +1,148 @@
+"""
+pgvector storage and search backend (VECTOR_BACKEND=pgvector).
+
+Embeddings live in products.embedding_vector with an HNSW index, and the
+keyword leg uses a GIN-indexed tsvector over title and description, so
+hybrid search (vector + keyword + filters + reciprocal-rank fusion) is a
+single SQL round trip against the same rows every app instance reads.
+"""
+import logging
+from typing import Dict, List
+from sqlalchemy import text, select, column, Float, Integer
+from sqlalchemy.orm import Session
+from .models import Product, EMBEDDING_DIM
+from .search_filters import sql_where_clause
+from .keyword_index import words
+from .fusion import RRF_K, VECTOR_WEIGHT, KEYWORD_WEIGHT
+
+logger = logging.getLogger(__name__)
+
+TSVECTOR = "to_tsvector('english', coalesce(products.title, '') || ' ' || coalesce(products.description, ''))"
+
+# Product columns returned by hybrid_query (the embeddings stay in the database)
+PRODUCT_COLUMNS = ", ".join(
+    f"products.{c.name}" for c in Product.__table__.columns
+    if c.name not in ("embedding", "embedding_vector")
+)
+
+SCHEMA_STATEMENTS = [
+    "CREATE EXTENSION IF NOT EXISTS vector",
+    f"ALTER TABLE products ADD COLUMN IF NOT EXISTS embedding_vector vector({EMBEDDING_DIM})",
+    "CREATE INDEX IF NOT EXISTS products_embedding_hnsw ON products "
+    "USING hnsw (embedding_vector vector_cosine_ops)",
+    f"CREATE INDEX IF NOT EXISTS products_search_tsv ON products USING gin (({TSVECTOR}))",
+    # Backfill from the JSON embeddings written by add_products_to_vector_db
+    # (cleared embeddings are JSON null, which does not cast to a vector)
+    "UPDATE products SET embedding_vector = embedding::text::vector "
+    "WHERE embedding IS NOT NULL AND json_typeof(embedding) = 'array' AND embedding_vector IS NULL",
+]
+
+def ensure_pgvector_schema(engine):
+    """Create the extension, vector column and indexes (idempotent)."""
+    with engine.begin() as conn:
+        for statement in SCHEMA_STATEMENTS:
+            conn.execute(text(statement))
+    logger.info("pgvector column and indexes ready.")
+
+def _vector_literal(embedding: List[float]) -> str:
+    return "[" + ",".join(repr(float(x)) for x in embedding) + "]"
+
+def _or_tsquery(query_text: str) -> str:
+    # words() only yields [a-z0-9] terms, so the tsquery syntax is safe; Postgres
+    # does the stemming. Terms are OR-ed like the in-process BM25 leg
+    # (plainto_tsquery would AND them).
+    return " | ".join(sorted(set(words(query_text))))
+
+def vector_query(db: Session, query_embedding: List[float], n_results: int = 20,
+                 filters: Dict = None) -> Dict:
+    """Vector-only top-k. Returns a ChromaDB-shaped result with cosine distances."""
+    where, params = sql_where_clause(filters or {})
+    rows = db.execute(text(f"""
+        SELECT products.id, products.embedding_vector <=> CAST(:embedding AS vector) AS distance
+        FROM products
+        WHERE products.embedding_vector IS NOT NULL AND {where}
+        ORDER BY distance
+        LIMIT :limit
+    """), {"embedding": _vector_literal(query_embedding), "limit": n_results, **params}).all()
+    return {
+        "ids": [[str(r.id) for r in rows]],
+        "distances": [[float(r.distance) for r in rows]],
+    }
+
+def hybrid_query(db: Session, query_embedding: List[float], query_text: str,
+                 filters: Dict = None, limit: int = 20) -> List[Dict]:
+    """
+    Hybrid search in one statement: HNSW vector top-k and full-text top-k
+    (both filtered), fused with reciprocal-rank fusion, joined to products.
+    Returns the same candidate dicts as rag.hybrid_search_scored.
+    """
+    where, params = sql_where_clause(filters or {})
+    tsquery = _or_tsquery(query_text)
+    keyword_where = f"{TSVECTOR} @@ to_tsquery('english', :tsquery)" if tsquery else "FALSE"
+
+    statement = text(f"""
+        WITH vector_hits AS (
+            SELECT products.id,
+                   products.embedding_vector <=> CAST(:embedding AS vector) AS distance
+            FROM products
+            WHERE products.embedding_vector IS NOT NULL AND {where}
+            ORDER BY distance
+            LIMIT :limit
+        ),
+        vector_ranked AS (
+            SELECT id, distance, row_number() OVER (ORDER BY distance) AS vector_rank
+            FROM vector_hits
+        ),
+        keyword_hits AS (
+            SELECT products.id,
+                   ts_rank_cd({TSVECTOR}, to_tsquery('english', :tsquery)) AS keyword_score
+            FROM products
+            WHERE {keyword_where} AND {where}
+            ORDER BY keyword_score DESC
+            LIMIT :limit
+        ),
+        keyword_ranked AS (
+            SELECT id, keyword_score, row_number() OVER (ORDER BY keyword_score DESC) AS keyword_rank
+            FROM keyword_hits
+        ),
+        fused AS (
+            SELECT coalesce(v.id, k.id) AS id,
+                   v.distance, v.vector_rank, k.keyword_score, k.keyword_rank,
+                   coalesce(CAST(:vector_weight AS double precision) / (:rrf_k + v.vector_rank), 0)
+                     + coalesce(CAST(:keyword_weight AS double precision) / (:rrf_k + k.keyword_rank), 0) AS score
+            FROM vector_ranked v
+            FULL OUTER JOIN keyword_ranked k ON v.id = k.id
+            ORDER BY score DESC
+            LIMIT :limit
+        )
+        SELECT {PRODUCT_COLUMNS}, fused.score, fused.distance, fused.vector_rank,
+               fused.keyword_score, fused.keyword_rank
+        FROM fused JOIN products ON products.id = fused.id
+        ORDER BY fused.score DESC
+    """)
+    columns = [
+        column("score", Float), column("distance", Float), column("vector_rank", Integer),
+        column("keyword_score", Float), column("keyword_rank", Integer),
+    ]
+    rows = db.execute(select(Product, *columns).from_statement(statement), {
+        "embedding": _vector_literal(query_embedding),
+        "tsquery": tsquery,
+        "limit": limit,
+        "rrf_k": RRF_K,
+        "vector_weight": VECTOR_WEIGHT,
+        "keyword_weight": KEYWORD_WEIGHT,
+        **params,
+    }).all()
+
+    return [
+        {
+            "id": r.Product.id,
+            "score": float(r.score),
+            "vector_rank": r.vector_rank,
+            "vector_distance": r.distance,
+            "keyword_rank": r.keyword_rank,
+            "keyword_score": r.keyword_score,
+            "product": r.Product,
+        }
+        for r in rows
+    ]
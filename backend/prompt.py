@@ -0,0 +1,155 @@
+"""
+Chat prompt building within a token budget.
+
+Tokens are counted with tiktoken (the encoding of the chat model) when it
+is installed, otherwise estimated at CHARS_PER_TOKEN characters per token.
+build_messages() fits the product context into PROMPT_MAX_TOKENS:
+  - description sentences shared by several of the products (store
+    boilerplate such as "Available in sizes XS to 4XL.") and calls to
+    action ("Shop now!") are dropped
+  - each description is cut at a sentence or word boundary to
+    PROMPT_DESCRIPTION_TOKENS
+  - if the prompt is still too long, descriptions shrink further and then
+    the lowest-ranked products are left out; a description cut below
+    PROMPT_MIN_DESCRIPTION_TOKENS is dropped rather than left as a stub
+The answer itself is capped at CHAT_MAX_TOKENS.
+"""
+import os
+import re
+import logging
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from .models import Product
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "1000"))
+PROMPT_DESCRIPTION_TOKENS = int(os.getenv("PROMPT_DESCRIPTION_TOKENS", "40"))
+PROMPT_MIN_DESCRIPTION_TOKENS = int(os.getenv("PROMPT_MIN_DESCRIPTION_TOKENS", "8"))
+CHAT_MAX_TOKENS = int(os.getenv("CHAT_MAX_TOKENS", "350"))
+CHARS_PER_TOKEN = 4
+# Per-message framing tokens of the chat format, and the reply primer
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+SYSTEM_PROMPT = ("You are a shopping assistant for Hunnit activewear. The listed products are in stock "
+                 "and match the user's search. Recommend them warmly and briefly, mentioning names and "
+                 "prices in ₹. Never say a product is unavailable.")
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+CALL_TO_ACTION_RE = re.compile(r"^(shop|buy|order|get yours?)( (it|them|yours))? now\b", re.I)
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    """The model's tiktoken encoding (loaded once; the startup warm-up does it early), or None."""
+    try:
+        import tiktoken
+    except ImportError:  # optional: token counts are estimated without it
+        return None
+    try:
+        name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        name = "o200k_base"
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # The encoding file is downloaded on first use; offline, estimate instead (cached, so logged once)
+        logger.warning("tiktoken encoding %s unavailable, estimating token counts: %s", name, e)
+        return None
+
+def warm_tokenizer(model: str):
+    _encoding(model)
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+def count_message_tokens(messages: List[Dict], model: str) -> int:
+    return sum(count_tokens(m["content"], model) + MESSAGE_OVERHEAD for m in messages) + REPLY_OVERHEAD
+
+def _sentences(text: Optional[str]) -> List[str]:
+    sentences = [s for s in _SENTENCE_RE.split(" ".join((text or "").split())) if s]
+    # Scraped meta descriptions are often cut mid-sentence with "..."
+    if len(sentences) > 1 and sentences[-1].endswith(("...", "…")):
+        sentences.pop()
+    return sentences
+
+def _sentence_key(sentence: str) -> str:
+    return " ".join(re.findall(r"\w+", sentence.lower()))
+
+def compress_descriptions(descriptions: List[Optional[str]]) -> List[str]:
+    """Descriptions without calls to action and without sentences repeated across products."""
+    split = [_sentences(d) for d in descriptions]
+    seen_in = Counter(key for sentences in split for key in {_sentence_key(s) for s in sentences})
+    return [" ".join(s for s in sentences
+                     if not CALL_TO_ACTION_RE.match(s) and not (len(split) > 1 and seen_in[_sentence_key(s)] > 1))
+            for sentences in split]
+
+def truncate(text: str, max_tokens: int, model: str, min_tokens: int = 0) -> str:
+    """
+    Longest prefix of whole sentences (or, failing that, whole words) within
+    max_tokens; empty if a cut prefix would be shorter than min_tokens.
+    """
+    if max_tokens <= 0 or max_tokens < min_tokens or not text:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    kept = []
+    for sentence in _SENTENCE_RE.split(text):
+        if count_tokens(" ".join(kept + [sentence]), model) > max_tokens:
+            break
+        kept.append(sentence)
+    if kept:
+        prefix = " ".join(kept)
+    else:
+        words = []
+        for word in text.split():
+            if count_tokens(" ".join(words + [word]) + "…", model) > max_tokens:
+                break
+            words.append(word)
+        prefix = " ".join(words) + "…" if words else ""
+    # A word or two ("Shop…") costs tokens without telling the model anything
+    return prefix if prefix and count_tokens(prefix, model) >= min_tokens else ""
+
+def _product_line(rank: int, product: Product, description: str) -> str:
+    price = f" - ₹{product.price:g}" if product.price is not None else ""
+    line = f"{rank}. **{product.title}**{price}"
+    return f"{line}\n   {description}" if description else line
+
+def _messages(query: str, lines: List[str]) -> List[Dict]:
+    context = "\n".join(lines)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f'Search: "{query}"\n\nProducts:\n{context}'}
+    ]
+
+def build_messages(query: str, products: List[Product], model: str,
+                   max_tokens: int = PROMPT_MAX_TOKENS,
+                   description_tokens: int = PROMPT_DESCRIPTION_TOKENS,
+                   min_description_tokens: int = PROMPT_MIN_DESCRIPTION_TOKENS) -> Tuple[List[Dict], int]:
+    """Chat messages for recommending products (best first) and their token count."""
+    descriptions = compress_descriptions([p.description for p in products])
+    while True:
+        lines = [_product_line(i, p, truncate(d, description_tokens, model, min_description_tokens))
+                 for i, (p, d) in enumerate(zip(products, descriptions), 1)]
+        messages = _messages(query, lines)
+        tokens = count_message_tokens(messages, model)
+        if tokens <= max_tokens or description_tokens == 0:
+            break
+        description_tokens //= 2
+        if description_tokens < min_description_tokens:
+            description_tokens = 0
+    # Titles and prices alone are over budget: leave out the lowest-ranked products
+    while tokens > max_tokens and len(lines) > 1:
+        lines.pop()
+        messages = _messages(query, lines)
+        tokens = count_message_tokens(messages, model)
+    if len(lines) < len(products):
+        logger.warning("Prompt budget of %s tokens fits %s of %s products", max_tokens, len(lines), len(products))
+    return messages, tokens
@@ -0,0 +1,116 @@
+"""
+Rule-based query understanding: the fast path before the LLM.
+
+parse_query() pulls price ranges ("under ₹1500", "between 800 and 1200",
+"1-1.5k") and catalog categories out of a query, notes colors and sizes,
+and scores how much of the rest it understood. Vocabularies come from the
+catalog itself (the keyword index terms and product categories), so a
+query made of words the catalog uses is handled locally; unknown words or
+phrases that need interpretation ("cheap", "not black") lower confidence
+and the caller falls back to the LLM.
+"""
+import os
+import re
+from typing import Any, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from .keyword_index import KeywordIndex, stem, words
+
+load_dotenv()
+
+QUERY_PARSER_ENABLED = os.getenv("QUERY_PARSER_ENABLED", "true").lower() == "true"
+# Share of query words the parser must recognize to skip the LLM
+QUERY_PARSER_MIN_CONFIDENCE = float(os.getenv("QUERY_PARSER_MIN_CONFIDENCE", "0.8"))
+
+_AMOUNT = r"(?:rs\.?|inr|₹|\$)?\s*(\d[\d,]*(?:\.\d+)?)\s*(k)?\b"
+# A bare "a-b" range needs an amount at least this large to count as prices
+MIN_BARE_RANGE_AMOUNT = 100
+BARE_RANGE = re.compile(rf"{_AMOUNT}\s*(?:-|to)\s*{_AMOUNT}", re.I)
+PRICE_PATTERNS = [
+    # (pattern, which bounds its amounts set), most specific first
+    (re.compile(rf"\b(?:between|from)\s+{_AMOUNT}\s*(?:and|to|-)\s*{_AMOUNT}", re.I), ("min_price", "max_price")),
+    (BARE_RANGE, ("min_price", "max_price")),
+    (re.compile(rf"\b(?:under|below|less than|cheaper than|up ?to|within|max(?:imum)?|at most)\s+{_AMOUNT}", re.I),
+     ("max_price",)),
+    (re.compile(rf"{_AMOUNT}\s+(?:or|and)\s+(?:less|below|under)\b", re.I), ("max_price",)),
+    (re.compile(rf"\b(?:over|above|more than|at least|min(?:imum)?|starting(?: at| from)?|from)\s+{_AMOUNT}", re.I),
+     ("min_price",)),
+    (re.compile(rf"{_AMOUNT}\s+(?:or|and)\s+(?:more|above|over)\b", re.I), ("min_price",)),
+]
+# Words that need interpretation the rules don't do
+LLM_WORDS = {"cheap", "cheapest", "affordable", "budget", "expensive", "premium", "luxury", "costly",
+             "not", "no", "without", "except", "excluding", "but", "vs", "versus", "compare", "gift",
+             "similar", "like", "alternative", "instead"}
+# Request phrasing that carries no search meaning
+FILLER_WORDS = {"find", "please", "get", "buy", "shop", "products", "product", "items", "item", "something",
+                "anything", "options", "recommend", "suggest", "good", "best", "nice", "can", "have", "do",
+                "any", "what", "which", "there", "us", "give"}
+COLOR_WORDS = {"black", "white", "grey", "gray", "charcoal", "blue", "navy", "aqua", "teal", "green", "olive",
+               "sage", "red", "maroon", "cherry", "pink", "purple", "lilac", "lavender", "brown", "mocha",
+               "beige", "cream", "yellow", "orange", "peach", "coral", "raspberry", "mint"}
+SIZE_RE = re.compile(r"\b(xxs|xs|s|m|l|xl|xxl|xxxl|[2-5]xl)\b", re.I)
+SIZE_CONTEXT_RE = re.compile(r"\bsize\s+(xxs|xs|s|m|l|xl|xxl|xxxl|[2-5]xl)\b", re.I)
+
+def _amount(number: str, thousands: Optional[str]) -> float:
+    value = float(number.replace(",", ""))
+    return value * 1000 if thousands else value
+
+def extract_prices(query: str) -> Tuple[Dict[str, float], str]:
+    """Price filters found in the query, and the query with those phrases removed."""
+    filters = {}
+    for pattern, bounds in PRICE_PATTERNS:
+        match = pattern.search(query)
+        if match is None:
+            continue
+        groups = match.groups()
+        amounts = [_amount(groups[i], groups[i + 1]) for i in range(0, len(groups), 2)]
+        if len(amounts) == 2 and groups[3] and not groups[1] and amounts[0] < 100:
+            amounts[0] *= 1000  # "1-1.5k"
+        if pattern is BARE_RANGE and max(amounts) < MIN_BARE_RANGE_AMOUNT:
+            continue
+        for bound, amount in zip(bounds, amounts):
+            filters.setdefault(bound, amount)
+        query = query[:match.start()] + " " + query[match.end():]
+    if filters.get("min_price") is not None and filters.get("max_price") is not None \
+            and filters["min_price"] > filters["max_price"]:
+        filters["min_price"], filters["max_price"] = filters["max_price"], filters["min_price"]
+    return filters, query
+
+def parse_query(query: str, index: KeywordIndex) -> Dict[str, Any]:
+    """
+    Returns {"query", "filters", "colors", "sizes", "confidence"}; confidence is
+    the share of remaining words found in the catalog vocabulary (0 when a word
+    needs interpretation or nothing searchable is left).
+    """
+    filters, rest = extract_prices(query)
+
+    sizes = [s.upper() for s in SIZE_CONTEXT_RE.findall(rest)]
+    # Sizes are not a search filter, so they stay in the search query and only skip scoring
+    scored = SIZE_CONTEXT_RE.sub(" ", rest)
+
+    lowered = f" {' '.join(words(scored))} "
+    categories = index.categories()
+    for category in sorted(categories, key=len, reverse=True):
+        if f" {category.lower()} " in lowered:
+            filters["category"] = category
+            break
+    category_words = {w for category in categories for w in words(category)}
+
+    tokens = [t for t in words(scored) if t not in FILLER_WORDS]
+    colors = [t for t in tokens if t in COLOR_WORDS and index.has_term(stem(t))]
+    known = 0
+    for token in tokens:
+        if token in LLM_WORDS:
+            return {"query": query, "filters": {}, "colors": [], "sizes": [], "confidence": 0.0}
+        if index.has_term(stem(token)) or token in category_words or SIZE_RE.fullmatch(token):
+            known += 1
+            if SIZE_RE.fullmatch(token) and len(token) > 1:
+                sizes.append(token.upper())
+    confidence = known / len(tokens) if tokens else 0.0
+
+    # Keep the user's wording (minus price phrases) as the search query
+    search_query = " ".join(rest.split()) or query
+    return {"query": search_query, "filters": filters, "colors": colors, "sizes": sizes,
+            "confidence": confidence}
+
+def confident(analysis: Dict[str, Any], min_confidence: float = QUERY_PARSER_MIN_CONFIDENCE) -> bool:
+    return analysis["confidence"] >= min_confidence
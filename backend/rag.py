@@ -1,188 +1,617 @@
 import os
-from typing import List, Dict, Any
+import logging
+import asyncio
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 from .models import Product
-from .database import SessionLocal
-import openai
+from .database import session_scope
 from dotenv import load_dotenv
 import json
-import numpy as np
-from .vector_store import query_vector_db
+from .vector_store import vector_search, refresh_vector_backend, warm_vector_backend, VECTOR_BACKEND
+from .embeddings import get_embedding_provider
+from . import pgvector_store
+from .embedding_cache import embedding_cache, normalize_text
+from .response_cache import response_cache
+from .keyword_index import keyword_index
+from .fusion import fuse
+from .rerank import get_reranker, RERANK_TOP_K
+from .search_filters import normalize_filters, sql_conditions
+from .catalog import catalog_version, on_catalog_change
+from .observability import span, record_usage, usage_summary, QUERY_ANALYSIS
+from .prompt import build_messages, CHAT_MAX_TOKENS
+from .query_parser import parse_query, confident, QUERY_PARSER_ENABLED
+from collections import OrderedDict
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-openai.api_key = OPENAI_API_KEY
+
+# The openai package takes about a second to import, so it is loaded on
+# first use (or by the startup warm-up) rather than with this module
+openai = None
+
+def get_openai():
+    """The openai module, configured with OPENAI_API_KEY."""
+    global openai
+    if openai is None:
+        import openai as module
+        module.api_key = OPENAI_API_KEY
+        openai = module
+    return openai
+
+FILTER_MODEL = "gpt-4o-mini"
+CHAT_MODEL = "gpt-4o"
+
+# Fused candidates handed from hybrid search to product selection
+CANDIDATE_LIMIT = int(os.getenv("CANDIDATE_LIMIT", "10"))
+
+NO_RESULTS_MESSAGE = "I'm sorry, I couldn't find any products matching your query. Could you try searching for gym wear, leggings, sports bras, or other athletic clothing?"
+
+def _on_catalog_change(version: int):
+    """Products changed in another process: rebuild in-process indexes and drop cached answers."""
+    logger.info("Catalog changed (version %s), refreshing search indexes", version)
+    keyword_index.reset()
+    refresh_vector_backend()
+    response_cache.clear()
+    # Rule-based analyses depend on the catalog vocabulary
+    with _analysis_lock:
+        _analysis_cache.clear()
+
+on_catalog_change(_on_catalog_change)
+
+def warm_search_indexes():
+    """Build the in-process keyword and vector indexes up front (app startup, the preloading server)."""
+    with session_scope() as db:
+        keyword_index.ensure_loaded(db)
+    warm_vector_backend()
+
+def _sync_catalog():
+    """Notice catalog changes made by other processes (cheap: the version is cached briefly)."""
+    try:
+        catalog_version()
+    except Exception as e:
+        logger.warning("Catalog version check failed: %s", e)
+
+_async_client = None
+
+def get_async_client() -> "openai.AsyncOpenAI":
+    """Return the shared AsyncOpenAI client, creating it on first use."""
+    global _async_client
+    if _async_client is None:
+        _async_client = get_openai().AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return _async_client
 
 def get_embedding(text: str) -> List[float]:
-    """Generate embedding for text using OpenAI."""
-    response = openai.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
-    return response.data[0].embedding
+    """Generate embedding for text with the configured provider (cached)."""
+    provider = get_embedding_provider()
+    with span("embedding"):
+        return embedding_cache.get_or_compute(text, provider.model, provider.embed_query)
 
-def extract_filters_and_query(user_query: str) -> Dict[str, Any]:
-    """Use LLM to extract structured filters and a refined search query."""
-    prompt = f"""
+async def aget_embedding(text: str) -> List[float]:
+    """Async version of get_embedding."""
+    provider = get_embedding_provider()
+    with span("embedding"):
+        return await embedding_cache.aget_or_compute(text, provider.model, provider.aembed_query)
+
+# Extracted filters per normalized query (from the parser or the LLM), so exact repeats skip both
+ANALYSIS_CACHE_SIZE = 1024
+_analysis_cache = OrderedDict()
+_analysis_lock = threading.Lock()
+
+def _cached_analysis(user_query: str) -> Optional[Dict[str, Any]]:
+    key = normalize_text(user_query)
+    with _analysis_lock:
+        analysis = _analysis_cache.get(key)
+        if analysis is not None:
+            _analysis_cache.move_to_end(key)
+        return analysis
+
+def _remember_analysis(user_query: str, analysis: Dict[str, Any]):
+    with _analysis_lock:
+        _analysis_cache[normalize_text(user_query)] = analysis
+        while len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+
+def _parse_locally(user_query: str) -> Optional[Dict[str, Any]]:
+    """Rule-based analysis against the catalog vocabulary; None when the LLM is needed."""
+    if not QUERY_PARSER_ENABLED:
+        return None
+    _sync_catalog()
+    if not keyword_index.loaded:
+        with session_scope() as db:
+            keyword_index.ensure_loaded(db)
+    with span("parse_query"):
+        analysis = parse_query(user_query, keyword_index)
+    if not confident(analysis):
+        logger.debug("Query parser confidence %.2f, asking the LLM", analysis["confidence"])
+        return None
+    return analysis
+
+def _filter_prompt(user_query: str) -> str:
+    return f"""
     Analyze the user query: "{user_query}"
     Extract a search query and any filters (category, min_price, max_price).
     Return JSON only.
     Example: {{"query": "gym wear", "filters": {{"category": "Activewear", "max_price": 50}}}}
     """
-    
+
+def _filter_messages(user_query: str) -> List[Dict]:
+    return [{"role": "system", "content": "You are a search assistant."},
+            {"role": "user", "content": _filter_prompt(user_query)}]
+
+def extract_filters_and_query(user_query: str) -> Dict[str, Any]:
+    """
+    Extract structured filters and a refined search query: the rule-based
+    parser when it is confident, the LLM otherwise.
+    """
+    cached = _cached_analysis(user_query)
+    if cached is not None:
+        QUERY_ANALYSIS.inc(source="cache")
+        return cached
+    analysis = _parse_locally(user_query)
+    if analysis is not None:
+        QUERY_ANALYSIS.inc(source="parser")
+        _remember_analysis(user_query, analysis)
+        return analysis
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": "You are a search assistant."},
-                      {"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        return json.loads(response.choices[0].message.content)
+        with span("extract_filters"):
+            response = get_openai().chat.completions.create(
+                model=FILTER_MODEL,
+                messages=_filter_messages(user_query),
+                response_format={"type": "json_object"}
+            )
+        record_usage(FILTER_MODEL, response.usage)
+        analysis = json.loads(response.choices[0].message.content)
+        QUERY_ANALYSIS.inc(source="llm")
+        _remember_analysis(user_query, analysis)
+        return analysis
     except Exception as e:
-        print(f"Error extracting filters: {e}")
+        logger.warning("Error extracting filters: %s", e)
+        QUERY_ANALYSIS.inc(source="error")
         return {"query": user_query, "filters": {}}
 
-def hybrid_search(db: Session, query_text: str, filters: Dict, limit: int = 20):
-    """Perform hybrid search: ChromaDB (Vector) + Keyword Match (DB)."""
-    # 1. Vector Search via ChromaDB
-    chroma_where = {}
-    if filters.get("category"):
-        chroma_where["category"] = filters["category"]
-    
+async def aextract_filters_and_query(user_query: str) -> Dict[str, Any]:
+    """Async version of extract_filters_and_query."""
+    cached = _cached_analysis(user_query)
+    if cached is not None:
+        QUERY_ANALYSIS.inc(source="cache")
+        return cached
+    analysis = await asyncio.to_thread(_parse_locally, user_query)
+    if analysis is not None:
+        QUERY_ANALYSIS.inc(source="parser")
+        _remember_analysis(user_query, analysis)
+        return analysis
     try:
-        vector_results = query_vector_db(
-            query_text=query_text,
-            n_results=limit,
-            where=chroma_where if chroma_where else None
-        )
-        
-        vector_ids = []
-        if vector_results and vector_results.get('ids'):
-            vector_ids = [int(id) for id in vector_results['ids'][0]]
-        
-        print(f"Vector search found {len(vector_ids)} IDs")
-            
-        if vector_ids:
-            vector_products = db.query(Product).filter(Product.id.in_(vector_ids)).all()
-        else:
-            vector_products = []
-        
-        print(f"Vector products: {len(vector_products)}")
+        with span("extract_filters"):
+            response = await get_async_client().chat.completions.create(
+                model=FILTER_MODEL,
+                messages=_filter_messages(user_query),
+                response_format={"type": "json_object"}
+            )
+        record_usage(FILTER_MODEL, response.usage)
+        analysis = json.loads(response.choices[0].message.content)
+        QUERY_ANALYSIS.inc(source="llm")
+        _remember_analysis(user_query, analysis)
+        return analysis
     except Exception as e:
-        print(f"Vector search error: {e}")
-        vector_products = []
-    
-    # 2. Keyword Search (DB)
+        logger.warning("Error extracting filters: %s", e)
+        QUERY_ANALYSIS.inc(source="error")
+        return {"query": user_query, "filters": {}}
+
+def _vector_leg(query_text: str, filters: Dict, limit: int,
+                query_embedding: Optional[List[float]] = None) -> List[Tuple[int, float]]:
+    """Vector search on the configured backend. Returns (product_id, distance) pairs, nearest first."""
+    _sync_catalog()
     try:
-        keyword_products = db.query(Product).filter(
-            or_(
-                Product.title.ilike(f"%{query_text}%"),
-                Product.description.ilike(f"%{query_text}%")
+        with span("vector_search"):
+            vector_results = vector_search(
+                query_text=query_text,
+                n_results=limit,
+                filters=filters,
+                query_embedding=query_embedding
             )
-        ).limit(limit).all()
-        
-        print(f"Keyword search found {len(keyword_products)} products")
+
+        vector_hits = []
+        if vector_results and vector_results.get('ids'):
+            distances = (vector_results.get('distances') or [[]])[0]
+            for i, id in enumerate(vector_results['ids'][0]):
+                distance = float(distances[i]) if i < len(distances) else None
+                vector_hits.append((int(id), distance))
+
+        logger.debug("Vector search found %s IDs", len(vector_hits))
+    except Exception as e:
+        logger.warning("Vector search error: %s", e)
+        vector_hits = []
+    return vector_hits
+
+def _load_products(db: Session, ids: List[int], filters: Optional[Dict] = None) -> List[Product]:
+    """Load products by id (optionally only those passing filters), keeping the order of ids."""
+    rows = db.query(Product).filter(Product.id.in_(ids), *sql_conditions(filters or {})).all()
+    by_id = {p.id: p for p in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+def _keyword_leg(db: Session, query_text: str, filters: Dict, limit: int) -> List[Tuple[int, float]]:
+    """Keyword search via the BM25 index. Returns (product_id, score) pairs, best first."""
+    _sync_catalog()
+    try:
+        with span("keyword_search"):
+            keyword_index.ensure_loaded(db)
+            keyword_hits = keyword_index.search(query_text, limit=limit, filters=filters)
+
+        logger.debug("Keyword search found %s products", len(keyword_hits))
     except Exception as e:
-        print(f"Keyword search error: {e}")
-        keyword_products = []
-    
-    # 3. Fusion
-    seen_ids = set()
-    final_results = []
-    
-    for p in vector_products:
-        if p.id not in seen_ids:
-            final_results.append(p)
-            seen_ids.add(p.id)
-            
-    for p in keyword_products:
-        if p.id not in seen_ids:
-            final_results.append(p)
-            seen_ids.add(p.id)
-    
-    print(f"Combined results: {len(final_results)}")
-            
-    # Post-filter for price
-    filtered = []
-    for p in final_results:
-        if filters.get("max_price") and p.price > filters["max_price"]:
+        logger.warning("Keyword search error: %s", e)
+        keyword_hits = []
+    return keyword_hits
+
+def _resolve(db: Session, vector_hits: List[Tuple[int, float]], keyword_hits: List[Tuple[int, float]],
+             filters: Dict, limit: int) -> List[Dict]:
+    """
+    Fuse both legs and load the top products in fused order.
+    Filters were already applied by each leg; the SQL load re-checks them
+    in case the vector store metadata is stale.
+    """
+    with span("fusion"):
+        fused = fuse(vector_hits, keyword_hits)[:limit]
+
+    logger.debug("Combined results: %s", len(fused))
+
+    with span("load_products"):
+        products = {p.id: p for p in _load_products(db, [c["id"] for c in fused], filters)}
+
+    results = []
+    for c in fused:
+        p = products.get(c["id"])
+        if p is None:
             continue
-        filtered.append(p)
-    
-    print(f"After filtering: {len(filtered)}")
-        
-    return filtered[:limit]
+        c["product"] = p
+        results.append(c)
+    return results
+
+def _sql_hybrid(db: Session, query_text: str, filters: Dict, limit: int,
+                query_embedding: Optional[List[float]] = None) -> Optional[List[Dict]]:
+    """Single-round-trip hybrid search in Postgres (pgvector); None if it fails."""
+    try:
+        if query_embedding is None:
+            query_embedding = get_embedding(query_text)
+        with span("pgvector_hybrid"):
+            candidates = pgvector_store.hybrid_query(db, query_embedding, query_text, filters, limit)
+        logger.debug("pgvector hybrid search found %s products", len(candidates))
+        return candidates
+    except Exception as e:
+        logger.warning("pgvector hybrid search failed, falling back to ChromaDB: %s", e)
+        db.rollback()
+        return None
+
+@span("hybrid_search")
+def hybrid_search_scored(db: Session, query_text: str, filters: Dict, limit: int = CANDIDATE_LIMIT) -> List[Dict]:
+    """
+    Perform hybrid search: vector index (ChromaDB or NumPy) + BM25 keyword index, fused by rank.
+    With VECTOR_BACKEND=pgvector, vector, keyword, filters and fusion run as one SQL query.
+    Returns candidate dicts (product, score, vector_distance, keyword_score, ranks), best first.
+    """
+    if VECTOR_BACKEND == "pgvector":
+        candidates = _sql_hybrid(db, query_text, filters, limit)
+        if candidates is not None:
+            return candidates
+
+    vector_hits = _vector_leg(query_text, filters, limit)
+    keyword_hits = _keyword_leg(db, query_text, filters, limit)
+    return _resolve(db, vector_hits, keyword_hits, filters, limit)
+
+def hybrid_search(db: Session, query_text: str, filters: Dict, limit: int = CANDIDATE_LIMIT) -> List[Product]:
+    """Perform hybrid search: vector index + BM25 keyword index, best first."""
+    return [c["product"] for c in hybrid_search_scored(db, query_text, filters, limit)]
+
+def _in_session(fn, *args):
+    """Run fn(db, *args) with a dedicated session (for worker threads)."""
+    with session_scope() as db:
+        return fn(db, *args)
+
+async def _avector_leg(query_text: str, filters: Dict, limit: int,
+                       embedding_task: Optional[asyncio.Future] = None) -> List[Tuple[int, float]]:
+    """Embed with the async client, then run the vector search in a thread."""
+    try:
+        if embedding_task is not None:
+            query_embedding = await embedding_task
+        else:
+            query_embedding = await aget_embedding(query_text)
+    except Exception as e:
+        logger.warning("Vector search error: %s", e)
+        return []
+    return await asyncio.to_thread(_vector_leg, query_text, filters, limit, query_embedding)
+
+async def ahybrid_search_scored(query_text: str, filters: Dict, limit: int = CANDIDATE_LIMIT,
+                                vector_task: Optional[asyncio.Future] = None,
+                                embedding_task: Optional[asyncio.Future] = None) -> List[Dict]:
+    """
+    Async hybrid search: the vector and keyword legs run concurrently.
+    An already-running vector_task (e.g. a speculative search) is reused if given;
+    embedding_task is reused as the query embedding for the pgvector path.
+    """
+    with span("hybrid_search"):
+        return await _ahybrid_search_scored(query_text, filters, limit, vector_task, embedding_task)
+
+async def _ahybrid_search_scored(query_text: str, filters: Dict, limit: int,
+                                 vector_task: Optional[asyncio.Future],
+                                 embedding_task: Optional[asyncio.Future]) -> List[Dict]:
+    if VECTOR_BACKEND == "pgvector":
+        try:
+            query_embedding = await (embedding_task if embedding_task is not None else aget_embedding(query_text))
+        except Exception as e:
+            logger.warning("Embedding error: %s", e)
+            query_embedding = None
+        if query_embedding is not None:
+            candidates = await asyncio.to_thread(_in_session, _sql_hybrid, query_text, filters, limit, query_embedding)
+            if candidates is not None:
+                if vector_task is not None:
+                    _discard(asyncio.ensure_future(vector_task))
+                return candidates
 
+    if vector_task is None:
+        vector_task = _avector_leg(query_text, filters, limit)
+    keyword_task = asyncio.to_thread(_in_session, _keyword_leg, query_text, filters, limit)
+    vector_hits, keyword_hits = await asyncio.gather(vector_task, keyword_task)
+    return await asyncio.to_thread(_in_session, _resolve, vector_hits, keyword_hits, filters, limit)
+
+async def ahybrid_search(query_text: str, filters: Dict, limit: int = CANDIDATE_LIMIT,
+                         vector_task: Optional[asyncio.Future] = None,
+                         embedding_task: Optional[asyncio.Future] = None) -> List[Product]:
+    """Async version of hybrid_search."""
+    candidates = await ahybrid_search_scored(query_text, filters, limit, vector_task, embedding_task)
+    return [c["product"] for c in candidates]
+
+def _select_top_products(search_query: str, candidates: List[Dict], filters: Dict) -> List[Product]:
+    """Re-rank all fused candidates and keep the best RERANK_TOP_K for the prompt."""
+    with span("rerank"):
+        ranked = get_reranker().rerank(search_query, candidates, filters)
+    top_products = [c["product"] for c in ranked[:RERANK_TOP_K]]
+    logger.debug("Selected %s of %s candidates", len(top_products), len(candidates))
+    return top_products
+
+def _build_messages(query: str, top_products: List[Product]) -> List[Dict]:
+    messages, tokens = build_messages(query, top_products, CHAT_MODEL)
+    logger.debug("Prompt: %s tokens for %s products", tokens, len(top_products))
+    return messages
+
+def _cached_answer(db: Session, query_embedding: List[float], filters: Dict) -> Optional[Dict]:
+    """Chat result from the semantic response cache, or None on a miss."""
+    _sync_catalog()
+    with span("response_cache"):
+        hit = response_cache.lookup(query_embedding, filters)
+    if hit is None:
+        return None
+    products = _load_products(db, hit["product_ids"])
+    if len(products) != len(hit["product_ids"]):
+        return None
+    logger.debug("Response cache hit (similarity %.3f)", hit['similarity'])
+    return {
+        "response": hit["response"],
+        "products": products
+    }
+
+@span("chat")
 def chat_with_products(query: str):
-    db = SessionLocal()
-    
     # 1. Understand Query
     analysis = extract_filters_and_query(query)
     search_query = analysis.get("query", query)
-    filters = analysis.get("filters", {})
-    
-    print(f"Searching for: {search_query} with filters: {filters}")
-    
+    filters = normalize_filters(analysis.get("filters"))
+
+    logger.debug("Searching for: %s with filters: %s", search_query, filters)
+
+    try:
+        query_embedding = get_embedding(query)
+    except Exception as e:
+        logger.warning("Embedding error: %s", e)
+        query_embedding = None
+
+    # The session is closed before the LLM call, so a slow completion does
+    # not hold a pooled connection (loaded products stay usable detached)
+    with session_scope() as db:
+        # Semantic response cache
+        if query_embedding is not None:
+            cached = _cached_answer(db, query_embedding, filters)
+            if cached is not None:
+                return cached
+
+        # 2. Hybrid Search
+        candidates = hybrid_search_scored(db, search_query, filters)
+
+        # 3. Re-rank and pick products for the answer
+        top_products = _select_top_products(search_query, candidates, filters)
+
+    # 4. Generate Response
+    if not top_products:
+        return {
+            "response": NO_RESULTS_MESSAGE,
+            "products": []
+        }
+
+    with span("generation"):
+        response = get_openai().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=_build_messages(query, top_products),
+            temperature=0.3,
+            max_tokens=CHAT_MAX_TOKENS
+        )
+    record_usage(CHAT_MODEL, response.usage)
+    answer = response.choices[0].message.content
+
+    if query_embedding is not None:
+        response_cache.store(query_embedding, filters, answer, [p.id for p in top_products])
+
+    return {
+        "response": answer,
+        "products": top_products,
+        "usage": usage_summary(response.usage)
+    }
+
+def _discard(task: asyncio.Future):
+    """Cancel an unused speculative task without leaving its exception unretrieved."""
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+async def _aprepare(query: str, limit: int = CANDIDATE_LIMIT) -> Dict[str, Any]:
+    """
+    Start speculative retrieval and analyze the query for the async chat path.
+
+    The raw-query embedding and a vector search on the raw query start
+    immediately, concurrently with filter extraction.
+    """
+    raw_embedding = asyncio.ensure_future(aget_embedding(query))
+    # With pgvector, retrieval is a single SQL query, so only the embedding is speculative
+    speculative = None
+    if VECTOR_BACKEND != "pgvector":
+        speculative = asyncio.ensure_future(_avector_leg(query, {}, limit, raw_embedding))
+
+    # 1. Understand Query (overlaps with the speculative vector search)
+    analysis = await aextract_filters_and_query(query)
+    search_query = analysis.get("query", query) or query
+    filters = normalize_filters(analysis.get("filters"))
+
+    logger.debug("Searching for: %s with filters: %s", search_query, filters)
+
+    return {
+        "query": query,
+        "search_query": search_query,
+        "filters": filters,
+        "limit": limit,
+        "raw_embedding": raw_embedding,
+        "speculative": speculative,
+    }
+
+def _raw_embedding(plan: Dict[str, Any]) -> Optional[List[float]]:
+    task = plan["raw_embedding"]
+    if not task.done() or task.cancelled() or task.exception() is not None:
+        return None
+    return task.result()
+
+async def _acached_answer(plan: Dict[str, Any]) -> Optional[Dict]:
+    """Check the semantic response cache using the raw-query embedding."""
+    try:
+        await plan["raw_embedding"]
+    except Exception as e:
+        logger.warning("Embedding error: %s", e)
+        return None
+    cached = await asyncio.to_thread(_in_session, _cached_answer, _raw_embedding(plan), plan["filters"])
+    if cached is not None and plan["speculative"] is not None:
+        _discard(plan["speculative"])
+    return cached
+
+def _remember_answer(plan: Dict[str, Any], answer: str, top_products: List[Product]):
+    query_embedding = _raw_embedding(plan)
+    if query_embedding is not None and top_products:
+        response_cache.store(query_embedding, plan["filters"], answer, [p.id for p in top_products])
+
+async def _aretrieve(plan: Dict[str, Any]) -> List[Dict]:
+    """
+    Hybrid retrieval for the async chat path.
+
+    The speculative raw-query search is reused when extraction leaves the
+    query and the vector filters unchanged; otherwise the raw-query
+    embedding is still reused if the refined query is the same text.
+    """
+    query, search_query, filters, limit = plan["query"], plan["search_query"], plan["filters"], plan["limit"]
+    speculative, raw_embedding = plan["speculative"], plan["raw_embedding"]
+
     # 2. Hybrid Search
-    candidates = hybrid_search(db, search_query, filters, limit=20)
-    
-    # 3. Filter to exact title matches if available
-    exact_matches = [p for p in candidates if query.lower() in p.title.lower()]
-    
-    if exact_matches:
-        top_products = exact_matches[:5]
-        print(f"Found {len(exact_matches)} exact title matches")
+    same_text = normalize_text(search_query) == normalize_text(query)
+    embedding_task = raw_embedding if same_text else None
+    if speculative is None:
+        vector_task = None
+    elif same_text and not filters:
+        vector_task = speculative
     else:
-        top_products = candidates[:5]
-        print(f"No exact matches, using top {len(top_products)} results")
-    
-    # 4. Generate Response
+        _discard(speculative)
+        vector_task = _avector_leg(search_query, filters, limit, embedding_task)
+
+    return await ahybrid_search_scored(search_query, filters, limit=limit, vector_task=vector_task,
+                                       embedding_task=embedding_task)
+
+async def achat_with_products(query: str):
+    """Async version of chat_with_products."""
+    with span("chat"):
+        return await _achat_with_products(query)
+
+async def _achat_with_products(query: str):
+    plan = await _aprepare(query)
+    cached = await _acached_answer(plan)
+    if cached is not None:
+        return cached
+
+    candidates = await _aretrieve(plan)
+    # In a thread: a cross-encoder may take up to its latency budget
+    top_products = await asyncio.to_thread(_select_top_products, plan["search_query"], candidates, plan["filters"])
+
     if not top_products:
         return {
-            "response": "I'm sorry, I couldn't find any products matching your query. Could you try searching for gym wear, leggings, sports bras, or other athletic clothing?",
+            "response": NO_RESULTS_MESSAGE,
             "products": []
         }
-    
-    # Build context with numbered list
-    context_lines = []
-    for i, p in enumerate(top_products, 1):
-        desc = p.description[:100] if p.description else "Activewear product"
-        context_lines.append(f"{i}. **{p.title}** - ₹{p.price}\n   {desc}")
-    
-    context = "\n\n".join(context_lines)
-    
-    system_prompt = f"""You are a helpful shopping assistant for Hunnit activewear.
-
-I am showing you {len(top_products)} products that match the user's search for "{query}".
-
-YOUR JOB: Recommend these products enthusiastically!
-
-RULES:
-- These products ARE available and match the search
-- Mention product names and prices (₹)
-- Be helpful and positive
-- DO NOT say "we don't have" - we DO have these products!"""
-    
-    user_prompt = f"""User searched for: "{query}"
-
-Here are the matching products:
-
-{context}
-
-Recommend these products to the user!"""
-    
-    response = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.3
-    )
-    
+
+    with span("generation"):
+        response = await get_async_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=_build_messages(query, top_products),
+            temperature=0.3,
+            max_tokens=CHAT_MAX_TOKENS
+        )
+    record_usage(CHAT_MODEL, response.usage)
+    answer = response.choices[0].message.content
+    _remember_answer(plan, answer, top_products)
+
     return {
-        "response": response.choices[0].message.content,
-        "products": top_products
+        "response": answer,
+        "products": top_products,
+        "usage": usage_summary(response.usage)
     }
+
+async def astream_chat_with_products(query: str):
+    """
+    Streaming version of achat_with_products.
+    Yields ("products", top_products) as soon as retrieval finishes, then
+    ("token", text) for each completion delta as it arrives and finally
+    ("usage", token counts) once the answer is complete.
+    """
+    plan = await _aprepare(query)
+    cached = await _acached_answer(plan)
+    if cached is not None:
+        yield "products", cached["products"]
+        yield "token", cached["response"]
+        return
+
+    candidates = await _aretrieve(plan)
+    # In a thread: a cross-encoder may take up to its latency budget
+    top_products = await asyncio.to_thread(_select_top_products, plan["search_query"], candidates, plan["filters"])
+
+    yield "products", top_products
+
+    if not top_products:
+        yield "token", NO_RESULTS_MESSAGE
+        return
+
+    # The generation span covers the whole stream (including time the client
+    # takes to read it); the usage chunk arrives last
+    with span("generation"):
+        stream = await get_async_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=_build_messages(query, top_products),
+            temperature=0.3,
+            max_tokens=CHAT_MAX_TOKENS,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        parts = []
+        usage = None
+        async for chunk in stream:
+            if chunk.usage is not None:
+                record_usage(CHAT_MODEL, chunk.usage)
+                usage = usage_summary(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield "token", chunk.choices[0].delta.content
+    _remember_answer(plan, "".join(parts), top_products)
+    yield "usage", usage
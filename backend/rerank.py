@@ -0,0 +1,195 @@
+"""
+Re-ranking of hybrid search candidates before prompt building.
+
+RERANKER picks the scorer applied to all fused candidates at once:
+  "features"      - cheap linear score over signals search already produced
+                    (fused score, vector similarity, BM25) plus title term
+                    coverage, price fit and category match (default)
+  "cross-encoder" - a local CPU cross-encoder over (query, product) pairs,
+                    batched; falls back to "features" when it misses
+                    RERANK_BUDGET_MS or is unavailable, and while a
+                    prediction that missed it is still running
+  "none"          - keep the fused order
+Only the best RERANK_TOP_K products go to the LLM.
+"""
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+from .keyword_index import tokenize
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RERANKER = os.getenv("RERANKER", "features")
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "5"))
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+
+# Weights of the feature scorer; each feature is scaled to [0, 1]
+FEATURE_WEIGHTS = {
+    "fused": 1.0,
+    "vector": 0.5,
+    "keyword": 0.5,
+    "title": 1.5,
+    "price": 0.5,
+    "category": 0.5,
+}
+
+def _min_max(values: List[Optional[float]], invert: bool = False) -> List[float]:
+    """Scale to [0, 1] (missing values score 0); invert for distances."""
+    present = [v for v in values if v is not None]
+    if not present:
+        return [0.0] * len(values)
+    lo, hi = min(present), max(present)
+    scaled = []
+    for v in values:
+        if v is None:
+            scaled.append(0.0)
+        elif hi == lo:
+            scaled.append(1.0)
+        else:
+            s = (v - lo) / (hi - lo)
+            scaled.append(1.0 - s if invert else s)
+    return scaled
+
+def _title_coverage(query_terms: set, title: str) -> float:
+    """Share of query terms found in the title, with a bonus when all of them are."""
+    if not query_terms:
+        return 0.0
+    covered = len(query_terms & set(tokenize(title))) / len(query_terms)
+    return min(1.0, covered + (0.25 if covered == 1.0 else 0.0))
+
+def _price_fit(price: Optional[float], filters: Dict) -> float:
+    min_price, max_price = filters.get("min_price"), filters.get("max_price")
+    if price is None or (min_price is None and max_price is None):
+        return 0.0
+    if (min_price is not None and price < min_price) or (max_price is not None and price > max_price):
+        return 0.0
+    return 1.0
+
+def _category_match(category: Optional[str], filters: Dict) -> float:
+    wanted = filters.get("category")
+    if not wanted or not category:
+        return 0.0
+    return 1.0 if wanted.lower() == category.lower() else 0.0
+
+def feature_scores(query: str, candidates: List[Dict], filters: Dict) -> List[float]:
+    query_terms = set(tokenize(query))
+    features = {
+        "fused": _min_max([c.get("score") for c in candidates]),
+        "vector": _min_max([c.get("vector_distance") for c in candidates], invert=True),
+        "keyword": _min_max([c.get("keyword_score") for c in candidates]),
+        "title": [_title_coverage(query_terms, c["product"].title) for c in candidates],
+        "price": [_price_fit(c["product"].price, filters) for c in candidates],
+        "category": [_category_match(c["product"].category, filters) for c in candidates],
+    }
+    totals = np.zeros(len(candidates))
+    for name, values in features.items():
+        totals += FEATURE_WEIGHTS[name] * np.asarray(values)
+    return totals.tolist()
+
+class Reranker:
+    """Reorders candidate dicts (from hybrid_search_scored), best first, setting "rerank_score"."""
+
+    def scores(self, query: str, candidates: List[Dict], filters: Dict) -> Optional[List[float]]:
+        return None
+
+    def warm(self):
+        """Load models up front (startup warm-up) instead of on the first query."""
+
+    def rerank(self, query: str, candidates: List[Dict], filters: Optional[Dict] = None) -> List[Dict]:
+        if len(candidates) < 2:
+            return candidates
+        scores = self.scores(query, candidates, filters or {})
+        if scores is None:
+            return candidates
+        for c, score in zip(candidates, scores):
+            c["rerank_score"] = float(score)
+        # sorted() is stable: ties keep the fused order
+        return sorted(candidates, key=lambda c: c["rerank_score"], reverse=True)
+
+class FeatureReranker(Reranker):
+    def scores(self, query: str, candidates: List[Dict], filters: Dict) -> List[float]:
+        return feature_scores(query, candidates, filters)
+
+class CrossEncoderReranker(Reranker):
+    """Local cross-encoder with a latency budget; the model loads on first use."""
+
+    def __init__(self, model: str = RERANK_MODEL, budget_ms: float = RERANK_BUDGET_MS):
+        self.model = model
+        self.budget = budget_ms / 1000
+        self._encoder = None
+        self._load_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        # A prediction that missed the budget keeps running and would hold up every later one
+        self._overdue = None
+        self.timeouts = 0
+        self.skipped = 0
+
+    def _get_encoder(self):
+        with self._load_lock:
+            if self._encoder is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                except ImportError:
+                    raise RuntimeError("sentence-transformers is required for RERANKER=cross-encoder")
+                self._encoder = CrossEncoder(self.model, device="cpu")
+                logger.info("Loaded cross-encoder %s", self.model)
+        return self._encoder
+
+    def warm(self):
+        self._get_encoder()
+
+    def _predict(self, pairs):
+        return self._get_encoder().predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+
+    def scores(self, query: str, candidates: List[Dict], filters: Dict) -> List[float]:
+        overdue = self._overdue
+        if overdue is not None and not overdue.done():
+            self.skipped += 1
+            return feature_scores(query, candidates, filters)
+        pairs = [(query, f"{c['product'].title}. {c['product'].description or ''}") for c in candidates]
+        future = self._pool.submit(self._predict, pairs)
+        try:
+            relevance = future.result(timeout=self.budget)
+        except FutureTimeout:
+            self._overdue = future
+            self.timeouts += 1
+            logger.warning("Cross-encoder exceeded %.0f ms, using feature scores", self.budget * 1000)
+            return feature_scores(query, candidates, filters)
+        except Exception as e:
+            logger.warning("Cross-encoder failed, using feature scores: %s", e)
+            return feature_scores(query, candidates, filters)
+        # Price and category filters still count on top of text relevance
+        scaled = _min_max([float(r) for r in relevance])
+        return [s + FEATURE_WEIGHTS["price"] * _price_fit(c["product"].price, filters)
+                + FEATURE_WEIGHTS["category"] * _category_match(c["product"].category, filters)
+                for s, c in zip(scaled, candidates)]
+
+RERANKERS = {
+    "none": Reranker,
+    "features": FeatureReranker,
+    "cross-encoder": CrossEncoderReranker,
+}
+
+def create_reranker(name: str = RERANKER) -> Reranker:
+    if name not in RERANKERS:
+        raise ValueError(f"Unknown RERANKER: {name}")
+    return RERANKERS[name]()
+
+_reranker: Optional[Reranker] = None
+
+def get_reranker() -> Reranker:
+    global _reranker
+    if _reranker is None:
+        _reranker = create_reranker()
+    return _reranker
+
+def set_reranker(reranker: Reranker):
+    global _reranker
+    _reranker = reranker
@@ -0,0 +1,129 @@
+"""
+Semantic cache for full chat answers.
+A query hits when its embedding is close enough (cosine >= threshold) to a
+cached query with the same extracted filters. Entries are dropped when a
+product they reference changes.
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Iterable
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+
+def filters_key(filters: Dict) -> str:
+    """Canonical form of extracted filters, so equal filters compare equal."""
+    return json.dumps(filters or {}, sort_keys=True, default=str)
+
+class ResponseCache:
+    def __init__(self, threshold: float = RESPONSE_CACHE_THRESHOLD,
+                 max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._by_product = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for product_id in entry["product_ids"]:
+            ids = self._by_product.get(product_id)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_product[product_id]
+
+    def lookup(self, embedding: List[float], filters: Dict) -> Optional[Dict]:
+        """Return {"response", "product_ids", "similarity"} for the best match, or None."""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        query = query / norm
+        key = filters_key(filters)
+        now = time.time()
+
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id, entry in list(self._entries.items()):
+                if now - entry["created_at"] > self.ttl:
+                    self._drop(entry_id)
+                    continue
+                if entry["filters_key"] != key:
+                    continue
+                score = float(np.dot(entry["embedding"], query))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            entry = self._entries[best_id]
+            return {
+                "response": entry["response"],
+                "product_ids": list(entry["product_ids"]),
+                "similarity": best_score,
+            }
+
+    def store(self, embedding: List[float], filters: Dict, response: str, product_ids: List[int]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "embedding": vector / norm,
+                "filters_key": filters_key(filters),
+                "response": response,
+                "product_ids": list(product_ids),
+                "created_at": time.time(),
+            }
+            for product_id in product_ids:
+                self._by_product.setdefault(product_id, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_products(self, product_ids: Iterable[int]) -> int:
+        """Drop every entry that references one of product_ids. Returns the number dropped."""
+        with self._lock:
+            entry_ids = set()
+            for product_id in product_ids:
+                entry_ids |= self._by_product.get(product_id, set())
+            for entry_id in entry_ids:
+                self._drop(entry_id)
+            return len(entry_ids)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_product.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+response_cache = ResponseCache()
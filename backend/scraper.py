@@ -1,156 +1,447 @@
 import os
-import json
+import logging
 import time
+import json
+import random
+import hashlib
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from firecrawl import FirecrawlApp
+from sqlalchemy import Text, cast, or_
 from sqlalchemy.orm import Session
-from .models import Product
+from sqlalchemy.sql import func
+from .models import Product, USE_PGVECTOR
 from .database import SessionLocal
+from .catalog import bump_catalog_version
 from dotenv import load_dotenv
 import re
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 FIRECRAWL_API_KEY = os.getenv("FIRECRAWL_API_KEY")
 
-def scrape_hunnit():
+COLLECTION_URL = "https://hunnit.com/collections/all"
+
+# Crawl tuning. The defaults match the Firecrawl free plan (2 concurrent
+# browsers) and the old one-request-every-2-seconds pace.
+SCRAPE_MAX_PRODUCTS = int(os.getenv("SCRAPE_MAX_PRODUCTS", "0"))  # 0 = no cap
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "2"))
+SCRAPE_RATE = float(os.getenv("SCRAPE_RATE", "0.5"))  # requests per second, 0 = unlimited
+SCRAPE_BURST = int(os.getenv("SCRAPE_BURST", "2"))
+SCRAPE_RETRIES = int(os.getenv("SCRAPE_RETRIES", "3"))
+SCRAPE_CHUNK_SIZE = int(os.getenv("SCRAPE_CHUNK_SIZE", "10"))
+SCRAPE_USE_BATCH = os.getenv("SCRAPE_USE_BATCH", "false").lower() == "true"
+SCRAPE_BATCH_SIZE = int(os.getenv("SCRAPE_BATCH_SIZE", "50"))
+# Send a conditional HEAD (If-None-Match / If-Modified-Since) to the store
+# before spending a Firecrawl request on a page we already have
+SCRAPE_CONDITIONAL = os.getenv("SCRAPE_CONDITIONAL", "true").lower() == "true"
+SCRAPE_HEAD_TIMEOUT = float(os.getenv("SCRAPE_HEAD_TIMEOUT", "10"))
+
+# Fields that make up a product's content hash
+CONTENT_FIELDS = ("title", "price", "description", "features", "image_url", "category")
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity` at once."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def with_retries(fn, *args, retries: int = SCRAPE_RETRIES, base_delay: float = 1.0, **kwargs):
+    """Call fn, retrying failures with exponential backoff and jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = base_delay * (2 ** attempt) + random.uniform(0, base_delay)
+            logger.info("    Retry %s/%s in %.1fs: %s", attempt + 1, retries, delay, e)
+            time.sleep(delay)
+
+def discover_product_urls(app, collection_url: str = COLLECTION_URL) -> List[str]:
+    """Use Firecrawl map to find product URLs under the collection."""
+    map_result = with_retries(app.map, collection_url)
+    # map_result is a MapData object with 'links' attribute
+    links = map_result.links if hasattr(map_result, 'links') else []
+
+    # Extract URLs from link objects
+    all_urls = []
+    for link in links:
+        if hasattr(link, 'url'):
+            all_urls.append(link.url)
+        elif isinstance(link, str):
+            all_urls.append(link)
+
+    # Filter for product URLs (deduplicated, in discovery order)
+    return list(dict.fromkeys(url for url in all_urls if '/products/' in url))
+
+def parse_product(item) -> Optional[Dict]:
+    """Turn a Firecrawl document into product fields, or None if it has no URL."""
+    metadata_dict = item.metadata.__dict__ if hasattr(item, 'metadata') and hasattr(item.metadata, '__dict__') else {}
+    markdown = (item.markdown if hasattr(item, 'markdown') else '') or ''
+    url = metadata_dict.get('source_url', metadata_dict.get('url', ''))
+
+    if not url:
+        return None
+
+    # Extract title
+    title = metadata_dict.get('title') or metadata_dict.get('og_title')
+    if not title or title == 'None':
+        # Extract from URL
+        url_parts = url.split('/')[-1].split('-')
+        title = ' '.join(word.capitalize() for word in url_parts)
+    elif '|' in title:
+        title = title.split('|')[0].strip()
+
+    description = metadata_dict.get('description') or metadata_dict.get('og_description', markdown[:500])
+    image_url = metadata_dict.get('og_image', '')
+
+    # Price extraction
+    price = 0.0
+    price_match = re.search(r'(?:Rs\.|₹|\$)\s?(\d+(?:,\d+)*(?:\.\d{2})?)', markdown)
+    if price_match:
+        try:
+            price = float(price_match.group(1).replace(',', ''))
+        except ValueError:
+            pass
+
+    return {
+        "title": title,
+        "price": price,
+        "description": description,
+        "features": {},
+        "image_url": image_url,
+        "category": "Activewear",
+        "product_url": url,
+    }
+
+def content_hash(product: Dict) -> str:
+    """Stable SHA-256 of the scraped fields, used to detect changed pages."""
+    payload = {field: product.get(field) for field in CONTENT_FIELDS}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def check_page(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+               session=None) -> Tuple[bool, Optional[str], Optional[str]]:
     """
-    Scrape Hunnit.com using Firecrawl's batch_scrape method.
+    Conditional HEAD request for url.
+    Returns (not_modified, etag, last_modified); validators are None when the
+    server does not send them. Errors count as modified so the page gets scraped.
     """
-    app = FirecrawlApp(api_key=FIRECRAWL_API_KEY)
-    
-    collection_url = "https://hunnit.com/collections/all"
-    
-    print(f"Step 1: Mapping {collection_url} to find product URLs...")
-    
-    # Use map to get all product URLs
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
     try:
-        map_result = app.map(collection_url)
-        # map_result is a MapData object with 'links' attribute
-        links = map_result.links if hasattr(map_result, 'links') else []
-        
-        # Extract URLs from link objects
-        all_urls = []
-        for link in links:
-            if hasattr(link, 'url'):
-                all_urls.append(link.url)
-            elif isinstance(link, str):
-                all_urls.append(link)
-        
-        # Filter for product URLs
-        product_urls = [url for url in all_urls if '/products/' in url][:30]
-        print(f"Found {len(product_urls)} product URLs")
-        
-        if len(product_urls) < 25:
-            print(f"Warning: Only found {len(product_urls)} products, need at least 25")
-            if len(product_urls) == 0:
-                return
-            
-    except Exception as e:
-        print(f"Map failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return
-    
-    print(f"\nStep 2: Scraping {min(len(product_urls), 25)} products individually...")
-    
-    # Scrape products individually (Firecrawl free plan works better this way)
-    scraped_data = []
-    for i, url in enumerate(product_urls[:25], 1):
+        response = (session or requests).head(url, headers=headers, allow_redirects=True,
+                                              timeout=SCRAPE_HEAD_TIMEOUT)
+    except requests.RequestException:
+        return False, etag, last_modified
+    if response.status_code == 304:
+        return True, etag, last_modified
+    return False, response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+def _check_pages(urls: List[str], known: Dict[str, Dict], workers: int) -> Dict[str, Dict]:
+    """Run check_page for every URL on a small pool. Returns url -> validators + not_modified."""
+    session = requests.Session()
+
+    def check(url):
+        row = known.get(url) or {}
+        not_modified, etag, last_modified = check_page(url, row.get("etag"), row.get("last_modified"), session)
+        return {"not_modified": not_modified, "etag": etag, "last_modified": last_modified}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return dict(zip(urls, pool.map(check, urls)))
+
+def _known_products(db: Session, urls: List[str]) -> Dict[str, Dict]:
+    """Stored sync state for the URLs already in the DB."""
+    known = {}
+    for start in range(0, len(urls), 500):
+        rows = db.query(Product.id, Product.product_url, Product.content_hash,
+                        Product.etag, Product.last_modified).filter(
+            Product.product_url.in_(urls[start:start + 500])
+        )
+        for r in rows:
+            known[r.product_url] = {"id": r.id, "content_hash": r.content_hash,
+                                    "etag": r.etag, "last_modified": r.last_modified}
+    return known
+
+def _skip_not_modified(db: Session, urls: List[str], workers: int) -> Tuple[List[str], Dict[str, Dict]]:
+    """
+    Drop known URLs whose page answers 304 (marking them seen).
+    Returns (urls still to scrape, url -> validators).
+    """
+    known = _known_products(db, urls)
+    validators = _check_pages(urls, known, workers)
+    not_modified = {url for url in urls if url in known and validators[url]["not_modified"]}
+    _touch(db, [known[url]["id"] for url in not_modified])
+    logger.info("%s known pages not modified, skipping them", len(not_modified))
+    return [url for url in urls if url not in not_modified], validators
+
+def _touch(db: Session, product_ids: List[int]):
+    """Mark products as seen in this crawl without rewriting them."""
+    if product_ids:
+        db.query(Product).filter(Product.id.in_(product_ids)).update(
+            {Product.last_seen_at: func.now()}, synchronize_session=False)
+        db.commit()
+
+def _scrape_individually(app, urls: List[str], bucket: TokenBucket, workers: int) -> Iterator:
+    """Scrape URLs on a worker pool, yielding documents as they complete."""
+    def scrape_one(url):
+        bucket.acquire()
+        return with_retries(app.scrape, url)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(scrape_one, url): url for url in urls}
+        for i, future in enumerate(as_completed(futures), 1):
+            url = futures[future]
+            try:
+                result = future.result()
+                logger.debug("  %s/%s: %s", i, len(urls), url.split('/')[-1][:40])
+                if result:
+                    yield result
+            except Exception as e:
+                logger.debug("  %s/%s: %s failed: %s", i, len(urls), url.split('/')[-1][:40], e)
+
+def _scrape_batches(app, urls: List[str], bucket: TokenBucket, batch_size: int, workers: int) -> Iterator:
+    """Scrape URLs with Firecrawl batch scraping, one batch job per chunk of URLs."""
+    for start in range(0, len(urls), batch_size):
+        batch = urls[start:start + batch_size]
+        bucket.acquire()
         try:
-            print(f"  {i}/25: {url.split('/')[-1][:40]}...")
-            result = app.scrape(url)
-            if result:
-                scraped_data.append(result)
-            time.sleep(2)  # Be nice to API
+            job = with_retries(app.batch_scrape, batch, formats=["markdown"], max_concurrency=workers)
         except Exception as e:
-            print(f"    Error: {e}")
+            logger.warning("  Batch %s failed: %s", start // batch_size + 1, e)
             continue
-    
-    batch_result = {'data': scraped_data}
-    
-    print(f"\nStep 3: Processing {len(batch_result.get('data', []))} scraped products...")
-    
-    db = SessionLocal()
-    count = 0
-    
-    for item in batch_result['data']:
-        if count >= 25:
-            break
-            
-        try:
-            # Extract data
-            metadata_dict = item.metadata.__dict__ if hasattr(item, 'metadata') and hasattr(item.metadata, '__dict__') else {}
-            markdown = item.markdown if hasattr(item, 'markdown') else ''
-            url = metadata_dict.get('source_url', metadata_dict.get('url', ''))
-            
-            if not url:
-                continue
-                
-            # Extract title
-            title = metadata_dict.get('title') or metadata_dict.get('og_title')
-            if not title or title == 'None':
-                # Extract from URL
-                url_parts = url.split('/')[-1].split('-')
-                title = ' '.join(word.capitalize() for word in url_parts)
-            elif '|' in title:
-                title = title.split('|')[0].strip()
-                
-            description = metadata_dict.get('description') or metadata_dict.get('og_description', markdown[:500])
-            image_url = metadata_dict.get('og_image', '')
-            
-            # Price extraction
-            price = 0.0
-            price_match = re.search(r'(?:Rs\.|₹|\$)\s?(\d+(?:,\d+)*(?:\.\d{2})?)', markdown)
-            if price_match:
-                try:
-                    price = float(price_match.group(1).replace(',', ''))
-                except:
-                    pass
-                    
-            # Check if exists
-            existing = db.query(Product).filter(Product.product_url == url).first()
-            if existing:
-                continue
-                
-            # Create product
-            new_product = Product(
-                title=title,
-                price=price,
-                description=description,
-                features={},
-                image_url=image_url,
-                category="Activewear",
-                product_url=url
-            )
-            
-            db.add(new_product)
-            count += 1
-            print(f"  {count}. {title} (${price})")
-            
-        except Exception as e:
-            print(f"  Error processing product: {e}")
+        documents = job.data if hasattr(job, 'data') else (job or {}).get('data', [])
+        logger.info("  Batch %s: %s/%s pages", start // batch_size + 1, len(documents), len(batch))
+        for document in documents or []:
+            yield document
+
+def _as_dict(p: Product) -> Dict:
+    return {
+        "id": p.id,
+        "title": p.title,
+        "description": p.description,
+        "price": p.price,
+        "category": p.category,
+        "features": p.features
+    }
+
+def _save_chunk(db: Session, parsed: List[Dict], validators: Dict[str, Dict]) -> Tuple[List[Dict], List[Dict], int]:
+    """
+    Insert new URLs and update rows whose content hash changed.
+    Returns (inserted, updated, unchanged_count); inserted/updated are dicts for indexing.
+    """
+    urls = [p["product_url"] for p in parsed]
+    existing = {p.product_url: p for p in db.query(Product).filter(Product.product_url.in_(urls))}
+
+    new_products, changed_products, unchanged = [], [], []
+    seen = set()
+    for data in parsed:
+        url = data["product_url"]
+        if url in seen:
+            continue
+        seen.add(url)
+        digest = content_hash(data)
+        sync = {
+            "content_hash": digest,
+            "etag": (validators.get(url) or {}).get("etag"),
+            "last_modified": (validators.get(url) or {}).get("last_modified"),
+            "last_seen_at": func.now(),
+        }
+        product = existing.get(url)
+        if product is None:
+            product = Product(**data, **sync)
+            db.add(product)
+            new_products.append(product)
             continue
-    
+
+        # Rows written before content hashes existed are compared field by field
+        stored = product.content_hash or content_hash({f: getattr(product, f) for f in CONTENT_FIELDS})
+        if stored != digest:
+            for field in CONTENT_FIELDS:
+                setattr(product, field, data[field])
+            product.embedding = None
+            if USE_PGVECTOR:
+                product.embedding_vector = None
+            product.updated_at = func.now()
+            changed_products.append(product)
+        else:
+            unchanged.append(product)
+        for field, value in sync.items():
+            setattr(product, field, value)
     db.commit()
-    
-    # Index to ChromaDB
+
+    return [_as_dict(p) for p in new_products], [_as_dict(p) for p in changed_products], len(unchanged)
+
+def _index_products(products: List[Dict]):
+    """(Re-)index new or changed products in the vector store and keyword index."""
+    if not products:
+        return
     from .vector_store import add_products_to_vector_db
-    
-    products_to_index = []
-    products = db.query(Product).all()
-    for p in products:
-        products_to_index.append({
-            "id": p.id,
-            "title": p.title,
-            "description": p.description,
-            "price": p.price,
-            "category": p.category
-        })
-        
-    add_products_to_vector_db(products_to_index)
-    
-    db.close()
-    print(f"\n✓ Successfully scraped {count} products and indexed in Vector DB.")
+    from .keyword_index import keyword_index
+
+    add_products_to_vector_db(products)
+    keyword_index.add_products(products)
+
+def _reindex_unembedded(db: Session, chunk_size: int = SCRAPE_CHUNK_SIZE) -> int:
+    """
+    Index products saved without an embedding, i.e. whose indexing failed
+    after their content hash was committed (in this or an earlier sync).
+    Returns the number indexed.
+    """
+    # Cleared embeddings are stored as JSON null, not SQL NULL (Postgres has no = for json, so compare text)
+    missing = or_(Product.embedding.is_(None), cast(Product.embedding, Text) == "null")
+    try:
+        ids = [row.id for row in db.query(Product.id).filter(missing).order_by(Product.id)]
+    except Exception as e:
+        logger.warning("  Error finding products without embeddings: %s", e)
+        db.rollback()
+        return 0
+    indexed = 0
+    for start in range(0, len(ids), chunk_size):
+        chunk = db.query(Product).filter(Product.id.in_(ids[start:start + chunk_size])).all()
+        try:
+            _index_products([_as_dict(p) for p in chunk])
+        except Exception as e:
+            logger.warning("  Error re-indexing %s products without embeddings: %s", len(chunk), e)
+            break
+        indexed += len(chunk)
+    if indexed:
+        logger.info("Re-indexed %s products that had no embedding", indexed)
+    return indexed
+
+def scrape_hunnit(app=None, max_products: int = SCRAPE_MAX_PRODUCTS, workers: int = SCRAPE_WORKERS,
+                  rate: float = SCRAPE_RATE, use_batch: bool = SCRAPE_USE_BATCH,
+                  chunk_size: int = SCRAPE_CHUNK_SIZE, conditional: bool = SCRAPE_CONDITIONAL,
+                  progress: Optional[Callable[[Dict], None]] = None) -> int:
+    """
+    Scrape Hunnit.com with Firecrawl, incrementally.
+
+    Known pages that answer a conditional HEAD with 304 are not scraped at
+    all. The rest are scraped concurrently (worker pool, or Firecrawl batch
+    jobs when use_batch is set) under a token-bucket rate limit with retries.
+    New URLs are inserted, pages whose content hash changed are updated, and
+    only those rows are re-embedded and re-indexed, in chunks while the crawl
+    is still running; products whose indexing failed are retried at the end
+    of every sync. `app` can be any object with Firecrawl's map/scrape/
+    batch_scrape methods (e.g. a local stub). `progress` is called with a
+    dict of counters after each chunk. Returns the number of new or updated
+    products.
+    """
+    app = app or FirecrawlApp(api_key=FIRECRAWL_API_KEY)
+
+    logger.info("Step 1: Mapping %s to find product URLs...", COLLECTION_URL)
+
+    try:
+        product_urls = discover_product_urls(app)
+    except Exception:
+        logger.exception("Map failed")
+        return 0
+
+    if max_products:
+        product_urls = product_urls[:max_products]
+    logger.info("Found %s product URLs", len(product_urls))
+    if not product_urls:
+        return 0
+
+    db = SessionLocal()
+    try:
+        validators = {}
+        if conditional:
+            product_urls, validators = _skip_not_modified(db, product_urls, workers)
+
+        logger.info("Step 2: Scraping %s products (%s, %s req/s)...", len(product_urls), 'batch' if use_batch else f'{workers} workers', rate or 'unlimited')
+
+        bucket = TokenBucket(rate, SCRAPE_BURST)
+        if use_batch:
+            documents = _scrape_batches(app, product_urls, bucket, SCRAPE_BATCH_SIZE, workers)
+        else:
+            documents = _scrape_individually(app, product_urls, bucket, workers)
+
+        added, updated, unchanged = 0, [], 0
+        pending = []
+
+        def flush():
+            nonlocal added, unchanged
+            if not pending:
+                return
+            try:
+                inserted, changed, same = _save_chunk(db, pending, validators)
+            except Exception as e:
+                logger.warning("  Error saving chunk of %s products: %s", len(pending), e)
+                db.rollback()
+                inserted, changed, same = [], [], 0
+            try:
+                _index_products(inserted + changed)
+            except Exception as e:
+                # Saved with embedding NULL: _reindex_unembedded picks them up
+                logger.warning("  Error indexing chunk of %s products: %s", len(inserted + changed), e)
+            if inserted or changed:
+                bump_catalog_version()
+            added += len(inserted)
+            updated.extend(p["id"] for p in changed)
+            unchanged += same
+            for p in inserted:
+                logger.debug("  + %s (₹%s)", p['title'], p['price'])
+            for p in changed:
+                logger.debug("  ~ %s (₹%s)", p['title'], p['price'])
+            pending.clear()
+            if progress:
+                progress({"total": len(product_urls), "added": added,
+                          "updated": len(updated), "unchanged": unchanged})
+
+        for item in documents:
+            try:
+                parsed = parse_product(item)
+            except Exception as e:
+                logger.warning("  Error processing product: %s", e)
+                continue
+            if parsed:
+                pending.append(parsed)
+            if len(pending) >= chunk_size:
+                flush()
+        flush()
+        if _reindex_unembedded(db, chunk_size):
+            bump_catalog_version()
+    finally:
+        db.close()
+
+    # New products may outrank anything in the chat answer cache; changed ones
+    # only invalidate the answers that cited them
+    from .response_cache import response_cache
+    if added:
+        response_cache.clear()
+    elif updated:
+        response_cache.invalidate_products(updated)
+
+    logger.info("✓ Sync complete: %s new, %s updated, %s unchanged.", added, len(updated), unchanged)
+    return added + len(updated)
 
 if __name__ == "__main__":
+    from .observability import configure_logging
+    configure_logging()
     scrape_hunnit()
@@ -0,0 +1,105 @@
+"""
+Search filters shared by every retrieval backend.
+Extracted filters are translated into a ChromaDB where clause, SQLAlchemy
+conditions, and an in-memory predicate for the keyword index, so that each
+leg returns a full top-k of matching products instead of post-filtering.
+
+To support a new attribute (e.g. size or color), store it in the product
+metadata written by add_products_to_vector_db / the keyword index and add
+an entry to FILTER_FIELDS.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func
+from .models import Product
+
+# filter name -> (product attribute, operator, value type)
+FILTER_FIELDS = {
+    "category": ("category", "$eq", str),
+    "min_price": ("price", "$gte", float),
+    "max_price": ("price", "$lte", float),
+}
+
+def normalize_filters(filters: Optional[Dict]) -> Dict[str, Any]:
+    """Keep supported filters with usable values, coerced to their type."""
+    normalized = {}
+    for name, value in (filters or {}).items():
+        if name not in FILTER_FIELDS or value is None or value == "":
+            continue
+        _, _, value_type = FILTER_FIELDS[name]
+        try:
+            if value_type is float and isinstance(value, str):
+                value = value.replace(",", "").replace("₹", "").replace("$", "").strip()
+            normalized[name] = value_type(value)
+        except (TypeError, ValueError):
+            continue
+    return normalized
+
+def _case_variants(value: str) -> List[str]:
+    return sorted({value, value.lower(), value.title(), value.upper()})
+
+def chroma_where(filters: Dict) -> Optional[Dict]:
+    """ChromaDB where clause for filters, or None if there is nothing to filter."""
+    clauses = []
+    for name, value in normalize_filters(filters).items():
+        field, op, value_type = FILTER_FIELDS[name]
+        if value_type is str and op == "$eq":
+            # Chroma string matching is case-sensitive
+            clauses.append({field: {"$in": _case_variants(value)}})
+        else:
+            clauses.append({field: {op: value}})
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+def sql_conditions(filters: Dict) -> List:
+    """SQLAlchemy conditions on Product for filters."""
+    conditions = []
+    for name, value in normalize_filters(filters).items():
+        field, op, value_type = FILTER_FIELDS[name]
+        column = getattr(Product, field)
+        if value_type is str and op == "$eq":
+            conditions.append(func.lower(column) == value.lower())
+        elif op == "$gte":
+            conditions.append(column >= value)
+        elif op == "$lte":
+            conditions.append(column <= value)
+        else:
+            conditions.append(column == value)
+    return conditions
+
+_SQL_OPERATORS = {"$eq": "=", "$gte": ">=", "$lte": "<="}
+
+def sql_where_clause(filters: Dict, table: str = "products") -> Tuple[str, Dict[str, Any]]:
+    """
+    Filters as a raw SQL boolean expression plus bind parameters, for
+    hand-written queries. Returns ("TRUE", {}) when there is nothing to filter.
+    """
+    clauses, params = [], {}
+    for name, value in normalize_filters(filters).items():
+        field, op, value_type = FILTER_FIELDS[name]
+        param = f"filter_{name}"
+        if value_type is str and op == "$eq":
+            clauses.append(f"lower({table}.{field}) = :{param}")
+            params[param] = value.lower()
+        else:
+            clauses.append(f"{table}.{field} {_SQL_OPERATORS[op]} :{param}")
+            params[param] = value
+    return (" AND ".join(clauses) if clauses else "TRUE"), params
+
+def matches_filters(attributes: Dict, filters: Dict) -> bool:
+    """Whether a product's attributes (a dict) pass filters."""
+    for name, value in normalize_filters(filters).items():
+        field, op, value_type = FILTER_FIELDS[name]
+        actual = attributes.get(field)
+        if actual is None:
+            return False
+        if value_type is str and op == "$eq":
+            if str(actual).lower() != value.lower():
+                return False
+        elif op == "$gte" and actual < value:
+            return False
+        elif op == "$lte" and actual > value:
+            return False
+    return True
@@ -0,0 +1,106 @@
+"""
+Production serving: gunicorn with pre-forked uvicorn workers.
+
+    gunicorn backend.main:app        # settings in gunicorn.conf.py
+
+The master imports the app once (preload_app), creates the schema, builds
+the search indexes and only then forks WEB_CONCURRENCY workers, which share
+the index memory copy-on-write: the NumPy vector matrix (memory-mapped when
+built with `python -m backend.numpy_index build`) and the keyword index.
+Database pools, the Chroma client and the embedding cache's SQLite file are
+opened by each worker after the fork.
+
+Index writes (scrape and import jobs) go through a single writer: workers
+only queue jobs (JOB_EXECUTOR=external) and the master runs one
+`python -m backend.jobs` process, restarted if it exits. Set
+SERVE_JOB_WORKER=false when the writer runs elsewhere (its own container or
+dyno). After each scrape or import the writer rewrites the vector index
+files stamped with the new catalog version; workers that notice the change
+memory-map them again (shared), or load privately from products.embedding
+if they get there before the files are written. The keyword index is
+rebuilt in each worker.
+"""
+import os
+import gc
+import sys
+import logging
+import subprocess
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Read by backend modules at import, so set before gunicorn preloads the app
+os.environ["JOB_EXECUTOR"] = "external"
+os.environ["INIT_DB_ON_STARTUP"] = "false"
+
+logger = logging.getLogger(__name__)
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+SERVE_JOB_WORKER = os.getenv("SERVE_JOB_WORKER", "true").lower() == "true"
+JOB_WORKER_RESTART_DELAY = float(os.getenv("JOB_WORKER_RESTART_DELAY", "5"))
+
+class JobWriter:
+    """The single job worker process, restarted when it exits."""
+
+    def __init__(self, restart_delay: float = JOB_WORKER_RESTART_DELAY):
+        self.restart_delay = restart_delay
+        self.process = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._supervise, daemon=True, name="job-writer").start()
+
+    def _supervise(self):
+        while not self._stopping.is_set():
+            # Own session: terminal and group signals go to gunicorn, which stops the writer in on_exit
+            self.process = subprocess.Popen([sys.executable, "-m", "backend.jobs"], start_new_session=True)
+            logger.info("Job writer started (pid %s)", self.process.pid)
+            self.process.wait()
+            if self._stopping.is_set():
+                return
+            logger.warning("Job writer exited with %s, restarting in %.0fs",
+                           self.process.returncode, self.restart_delay)
+            self._stopping.wait(self.restart_delay)
+
+    def stop(self):
+        self._stopping.set()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+job_writer = JobWriter()
+
+def when_ready(server):
+    """Master, after the app is preloaded and before workers fork: schema, indexes, job writer."""
+    from .init_db import init_db
+    from .database import engine
+    from .warmup import warm_up
+    from .vector_store import get_collection, close_client
+
+    init_db()
+    # Imports, search indexes and the tokenizer; workers create their own clients and models
+    warm_up(per_process=False)
+    try:
+        # Create the Chroma collection once, so workers never race to create it
+        get_collection()
+        close_client()
+    except Exception as e:
+        logger.warning("Creating the Chroma collection failed: %s", e)
+    # Workers open their own connections
+    engine.dispose()
+    # Keep the garbage collector from writing to (and so copying) preloaded objects in the workers
+    gc.freeze()
+    if SERVE_JOB_WORKER:
+        job_writer.start()
+
+def post_fork(server, worker):
+    from .database import engine
+    # Forget any pooled connection inherited from the master without closing it under the master
+    engine.dispose(close=False)
+
+def on_exit(server):
+    job_writer.stop()
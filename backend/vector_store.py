@@ -1,39 +1,136 @@
-import chromadb
-from chromadb.utils import embedding_functions
 import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from typing import List, Dict
+from .embedding_cache import embedding_cache
+from .embeddings import get_embedding_provider, EMBEDDING_PROVIDER, OPENAI_EMBEDDING_MODEL
+from .numpy_index import vector_index
+from .search_filters import chroma_where
+from .database import SessionLocal
+from .models import Product, USE_PGVECTOR
+from . import pgvector_store
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+# Embedding batches sent to the API concurrently (bulk import, large upserts)
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "4"))
+# "chroma" (default), "numpy" for the in-process index in numpy_index.py,
+# or "pgvector" for pgvector_store.py (ChromaDB stays the fallback)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+CHROMA_PATH = os.getenv("CHROMA_PATH", "chroma_db")
+
+# The Chroma client is opened on first use in each process: a client (its
+# SQLite connection) must not be inherited across a fork by server workers.
+# chromadb itself is imported then too: it is slow to import, and serving
+# with the numpy or pgvector backend only needs it for writes and fallbacks
+_client = None
+_collection = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def _embedding_function():
+    # Every write passes precomputed embeddings (from embeddings.py), so the
+    # collection's own embedding function is never called; it is kept for
+    # collections created with the OpenAI provider
+    if EMBEDDING_PROVIDER != "openai":
+        return None
+    from chromadb.utils import embedding_functions
+    return embedding_functions.OpenAIEmbeddingFunction(api_key=OPENAI_API_KEY, model_name=OPENAI_EMBEDDING_MODEL)
+
+def get_client():
+    global _client, _collection, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            import chromadb
+            _client = chromadb.PersistentClient(path=CHROMA_PATH)
+            _collection = None
+            _client_pid = os.getpid()
+        return _client
+
+def get_collection():
+    """The products collection (created if missing)."""
+    global _collection
+    client = get_client()
+    with _client_lock:
+        if _collection is None:
+            _collection = client.get_or_create_collection(name="products", embedding_function=_embedding_function())
+        return _collection
+
+def reset_collection():
+    """Delete and recreate the products collection (benchmarks, full re-imports)."""
+    global _collection
+    client = get_client()
+    with _client_lock:
+        try:
+            client.delete_collection("products")
+        except Exception:
+            pass
+        _collection = None
+    return get_collection()
+
+def close_client():
+    """Drop this process's Chroma client; the next use reopens it."""
+    global _client, _collection, _client_pid
+    with _client_lock:
+        if _client is not None:
+            _client.clear_system_cache()
+        _client, _collection, _client_pid = None, None, None
+
+def _document(p: Dict) -> str:
+    return f"{p['title']}. {p['description']}"
 
-# Initialize Chroma Client
-# We'll use a persistent client stored in the 'chroma_db' folder
-client = chromadb.PersistentClient(path="chroma_db")
+def _embed_batch(batch: List[str]) -> List[List[float]]:
+    return [[float(x) for x in vector] for vector in get_embedding_provider().embed(batch)]
 
-# Use OpenAI Embedding Function
-openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-    api_key=OPENAI_API_KEY,
-    model_name="text-embedding-3-small"
-)
+def embed_documents(documents: List[str], workers: int = EMBEDDING_WORKERS) -> List[List[float]]:
+    """Embed documents with the configured provider, in batches (up to `workers` in flight)."""
+    batches = [documents[start:start + EMBEDDING_BATCH_SIZE]
+               for start in range(0, len(documents), EMBEDDING_BATCH_SIZE)]
+    if len(batches) > 1 and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_embed_batch, batches))
+    else:
+        results = [_embed_batch(batch) for batch in batches]
+    return [vector for result in results for vector in result]
 
-# Get or Create Collection
-collection = client.get_or_create_collection(
-    name="products",
-    embedding_function=openai_ef
-)
+def _store_embeddings(products: List[Dict]):
+    """Persist embeddings to products.embedding (and embedding_vector with pgvector)."""
+    mappings = []
+    for p in products:
+        mapping = {"id": p["id"], "embedding": p["embedding"]}
+        if USE_PGVECTOR:
+            mapping["embedding_vector"] = p["embedding"]
+        mappings.append(mapping)
+    db = SessionLocal()
+    try:
+        db.bulk_update_mappings(Product, mappings)
+        db.commit()
+    finally:
+        db.close()
 
 def add_products_to_vector_db(products: List[Dict]):
     """
-    Add products to ChromaDB.
+    Add products to ChromaDB, products.embedding and the in-process vector index.
     products list should contain dicts with: id, title, description, price, category
+    and optionally a precomputed embedding (only missing embeddings are computed).
     """
     if not products:
         return
 
+    missing = [p for p in products if not p.get("embedding")]
+    if missing:
+        for p, embedding in zip(missing, embed_documents([_document(p) for p in missing])):
+            p["embedding"] = embedding
+
     ids = [str(p["id"]) for p in products]
-    documents = [f"{p['title']}. {p['description']}" for p in products]
+    documents = [_document(p) for p in products]
     metadatas = [
         {
             "title": p["title"],
@@ -44,20 +141,72 @@ def add_products_to_vector_db(products: List[Dict]):
         for p in products
     ]
 
-    collection.upsert(
+    get_collection().upsert(
         ids=ids,
         documents=documents,
-        metadatas=metadatas
+        metadatas=metadatas,
+        embeddings=[p["embedding"] for p in products]
     )
-    print(f"Indexed {len(products)} products in ChromaDB.")
+    logger.debug("Indexed %s products in ChromaDB.", len(products))
+
+    if missing:
+        _store_embeddings(missing)
+    if vector_index.loaded:
+        vector_index.add(products)
 
-def query_vector_db(query_text: str, n_results: int = 20, where: Dict = None):
+def _embed_query(text: str) -> List[float]:
+    return [float(x) for x in get_embedding_provider().embed_query(text)]
+
+def query_vector_db(query_text: str, n_results: int = 20, where: Dict = None,
+                    query_embedding: List[float] = None):
     """
     Query ChromaDB for relevant products.
+    The query embedding comes from the embedding cache unless query_embedding is given.
     """
-    results = collection.query(
-        query_texts=[query_text],
+    if query_embedding is None:
+        query_embedding = embedding_cache.get_or_compute(query_text, get_embedding_provider().model, _embed_query)
+    results = get_collection().query(
+        query_embeddings=[query_embedding],
         n_results=n_results,
         where=where
     )
     return results
+
+def warm_vector_backend():
+    """Load the in-process vector index up front when it is the configured backend."""
+    if VECTOR_BACKEND == "numpy" and not vector_index.loaded:
+        db = SessionLocal()
+        try:
+            vector_index.ensure_loaded(db)
+        finally:
+            db.close()
+
+def refresh_vector_backend():
+    """Drop in-process vector state after another process changed the catalog."""
+    if VECTOR_BACKEND == "numpy":
+        vector_index.reset()
+    elif VECTOR_BACKEND == "chroma":
+        # Chroma keeps its HNSW index in memory; reopen to see another process's writes
+        close_client()
+
+def vector_search(query_text: str, n_results: int = 20, filters: Dict = None,
+                  query_embedding: List[float] = None):
+    """
+    Vector search on the configured backend (VECTOR_BACKEND: "chroma", "numpy" or "pgvector").
+    Returns a ChromaDB-shaped result: {"ids": [[...]], "distances": [[...]]}.
+    """
+    if VECTOR_BACKEND in ("numpy", "pgvector") and query_embedding is None:
+        query_embedding = embedding_cache.get_or_compute(query_text, get_embedding_provider().model, _embed_query)
+    if VECTOR_BACKEND == "numpy":
+        warm_vector_backend()
+        return vector_index.query(query_embedding, n_results=n_results, filters=filters)
+    if VECTOR_BACKEND == "pgvector":
+        db = SessionLocal()
+        try:
+            return pgvector_store.vector_query(db, query_embedding, n_results=n_results, filters=filters)
+        except Exception as e:
+            logger.warning("pgvector search failed, falling back to ChromaDB: %s", e)
+        finally:
+            db.close()
+    return query_vector_db(query_text, n_results=n_results, where=chroma_where(filters or {}),
+                           query_embedding=query_embedding)
@@ -0,0 +1,103 @@
+"""
+Process warm-up, tracked for the readiness probe.
+
+Importing backend.main loads no heavy client: the openai package, chromadb,
+model libraries, the search indexes and the tokenizer are all loaded on
+first use. warm_up() loads them right after startup instead, step by step,
+so the first requests do not pay for it. A failed step is recorded and
+skipped (whatever it would have loaded is still built lazily when needed).
+/health/ready reports ready once every step has run.
+
+Steps marked per-process create clients or thread pools that must not cross
+a fork; the preloading server master (backend/serve.py) runs only the others.
+"""
+import time
+import logging
+import importlib
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def _import_clients():
+    from .rag import get_openai
+    from .vector_store import VECTOR_BACKEND
+    get_openai()
+    if VECTOR_BACKEND == "chroma":
+        importlib.import_module("chromadb")
+
+def _search_indexes():
+    from .rag import warm_search_indexes
+    warm_search_indexes()
+
+def _tokenizer():
+    from .prompt import warm_tokenizer
+    from .rag import CHAT_MODEL
+    warm_tokenizer(CHAT_MODEL)
+
+def _clients():
+    from .rag import get_async_client
+    from .vector_store import VECTOR_BACKEND, get_collection
+    get_async_client()
+    if VECTOR_BACKEND == "chroma":
+        get_collection()
+
+def _models():
+    from .embeddings import get_embedding_provider
+    from .rerank import get_reranker
+    get_embedding_provider().warm()
+    get_reranker().warm()
+
+# (name, function, per-process)
+STEPS: List[Tuple[str, Callable[[], None], bool]] = [
+    ("imports", _import_clients, False),
+    ("search_indexes", _search_indexes, False),
+    ("tokenizer", _tokenizer, False),
+    ("clients", _clients, True),
+    ("models", _models, True),
+]
+
+class WarmupState:
+    def __init__(self):
+        self.status = "pending"  # pending -> warming -> done
+        self.steps: Dict[str, Dict] = {}
+        self.seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.status == "done"
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {"status": self.status, "seconds": self.seconds, "steps": dict(self.steps)}
+
+warmup = WarmupState()
+
+def warm_up(per_process: bool = True):
+    """Run the warm-up steps (without the per-process ones in a preloading master)."""
+    start = time.perf_counter()
+    warmup.status = "warming"
+    for name, step, process_local in STEPS:
+        if process_local and not per_process:
+            continue
+        step_start = time.perf_counter()
+        error = None
+        try:
+            step()
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            logger.warning("Warm-up step %s failed: %s", name, error)
+        with warmup._lock:
+            warmup.steps[name] = {"seconds": round(time.perf_counter() - step_start, 4), "error": error}
+    warmup.seconds = round(time.perf_counter() - start, 4)
+    warmup.status = "done"
+    logger.info("Warm-up finished in %.2fs", warmup.seconds)
+
+def start_warm_up() -> threading.Thread:
+    """Warm up in the background, so the process answers liveness probes meanwhile."""
+    # Not ready until the thread has run (the state may be inherited from a preloading master)
+    warmup.status = "warming"
+    thread = threading.Thread(target=warm_up, daemon=True, name="warm-up")
+    thread.start()
+    return thread
@@ -0,0 +1 @@
+"""Offline retrieval benchmarks (python -m benchmarks.run)."""
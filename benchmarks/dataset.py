@@ -0,0 +1,57 @@
+"""
+Benchmark catalog: products_backup.json, optionally padded with synthetic
+products up to a target size.
+
+Synthetic products reuse the garment vocabulary of the real catalog under
+product lines that do not occur in it, so they compete with real products
+on generic words ("leggings", "sports bra") but never on the line names the
+labeled queries use. Generation is seeded, so every run sees the same data.
+"""
+import json
+import random
+from itertools import chain
+from typing import Dict, Iterator, List
+
+SYNTHETIC_LINES = ["Aura", "Nova", "Pulse", "Drift", "Halo", "Sprint", "Core", "Flex",
+                   "Stride", "Luna", "Terra", "Vibe", "Orbit", "Tempo", "Glide", "Summit"]
+SYNTHETIC_STYLES = ["", "High Waist", "Seamless", "Ribbed", "Cropped", "Relaxed Fit", "Ankle Length", "Mesh Panel"]
+SYNTHETIC_GARMENTS = ["Leggings", "Sports Bra", "Joggers", "Shorts", "Tank Top", "Crop Top", "Sweatshirt",
+                      "Jacket", "Capris", "Flare Pants", "Training Top", "Hoodie", "Track Pants"]
+SYNTHETIC_COLORS = ["black", "steel blue", "mocha brown", "lilac", "olive green", "cherry maroon",
+                    "cream beige", "hot pink", "charcoal", "sage"]
+SYNTHETIC_CATEGORIES = ["Activewear"] * 4 + ["Loungewear"]
+
+def load_products(path: str) -> List[Dict]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def synthetic_products(count: int, seed: int = 42) -> Iterator[Dict]:
+    rng = random.Random(seed)
+    for i in range(count):
+        line = rng.choice(SYNTHETIC_LINES)
+        style = rng.choice(SYNTHETIC_STYLES)
+        garment = rng.choice(SYNTHETIC_GARMENTS)
+        title = " ".join(part for part in (line, style, garment) if part)
+        colors = rng.sample(SYNTHETIC_COLORS, 3)
+        yield {
+            "title": title,
+            "price": float(rng.randrange(799, 4000, 50)),
+            "description": (f"Shop {title} in {', '.join(colors)}. Made from soft stretch fabric for gym, "
+                            f"yoga and everyday wear. Available in XS to XXL."),
+            "image_url": None,
+            "category": rng.choice(SYNTHETIC_CATEGORIES),
+            "product_url": f"https://synthetic.example/products/{title.lower().replace(' ', '-')}-{i}",
+            "features": {"colors": colors},
+        }
+
+def build_catalog(backup_path: str, size: int, out_path: str) -> int:
+    """Write the real products plus synthetic ones (up to `size`, if larger) as JSON Lines."""
+    products = load_products(backup_path)
+    total = 0
+    with open(out_path, 'w', encoding='utf-8') as f:
+        for product in chain(products, synthetic_products(max(0, size - len(products)))):
+            product = {k: v for k, v in product.items() if k != "id"}
+            f.write(json.dumps(product, ensure_ascii=False))
+            f.write("\n")
+            total += 1
+    return total
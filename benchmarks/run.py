@@ -0,0 +1,253 @@
+"""
+Offline benchmark: retrieval quality and latency with no network.
+
+    python -m benchmarks.run                      # products_backup.json only
+    python -m benchmarks.run --products 10000     # padded with synthetic products
+    python -m benchmarks.run --backend numpy --json results.json
+
+The catalog is imported through import_db (so load throughput is measured
+too) into a scratch SQLite database and ChromaDB under --workdir; pass
+--database-url for Postgres (its tables are dropped and recreated). OpenAI
+is replaced by the deterministic stubs in benchmarks/stubs.py (or, with
+--embeddings local, embeddings come from the local CPU model).
+
+Reports recall@k and nDCG@k of the vector leg, the keyword leg, the fused
+hybrid search and its re-ranked order on benchmarks/queries.json, then throughput and p50/p95/p99
+latency of hybrid_search, query_vector_db, GET /products and POST /chat.
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from typing import Callable, Dict, List
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKUP_PATH = os.path.join(ROOT, "products_backup.json")
+QUERIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "queries.json")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=0,
+                        help="catalog size; synthetic products pad products_backup.json up to it")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy", "pgvector"])
+    parser.add_argument("--database-url", help="defaults to a SQLite file in --workdir")
+    parser.add_argument("--workdir", default=os.path.join(ROOT, "benchmarks", ".work"))
+    parser.add_argument("--skip-load", action="store_true", help="reuse the catalog loaded by the previous run")
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per operation")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("-k", type=int, default=10, help="cut-off for recall@k / nDCG@k")
+    parser.add_argument("--embeddings", default="stub", choices=["stub", "local"],
+                        help="deterministic hashed-word stub, or the local CPU model (EMBEDDING_LOCAL_*)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated seconds per stub LLM call")
+    parser.add_argument("--response-cache", action="store_true",
+                        help="keep the semantic answer cache on (repeated /chat queries become cache hits)")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    return parser.parse_args()
+
+def configure_environment(args):
+    """Point the backend at scratch storage before any backend module is imported."""
+    os.makedirs(args.workdir, exist_ok=True)
+    # ChromaDB, the embedding cache and the NumPy index files use paths relative to the cwd
+    os.chdir(args.workdir)
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(args.workdir, 'bench.db')}"
+    os.environ["VECTOR_BACKEND"] = args.backend
+    os.environ["JOB_EXECUTOR"] = "thread"
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    os.environ["EMBEDDING_PROVIDER"] = "local" if args.embeddings == "local" else "openai"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not args.response_cache:
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    # The Chroma OpenAI embedding function wants a key even though it is never called
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("CHROMA_OPENAI_API_KEY", os.environ["OPENAI_API_KEY"])
+
+def install_stubs(args):
+    from backend import rag
+    from backend.embeddings import set_embedding_provider
+    from backend.models import EMBEDDING_DIM
+    from benchmarks.stubs import StubEmbeddingProvider, stub_openai, stub_async_client
+    rag.openai = stub_openai(args.llm_latency)
+    rag._async_client = stub_async_client(args.llm_latency)
+    if args.embeddings == "stub":
+        set_embedding_provider(StubEmbeddingProvider(EMBEDDING_DIM))
+
+def load_catalog(args) -> Dict:
+    """Recreate the scratch database and vector store, then import the benchmark catalog."""
+    from backend import vector_store
+    from backend.database import Base, engine
+    from backend.init_db import init_db
+    from backend.import_db import import_database
+    from backend.keyword_index import keyword_index
+    from backend.numpy_index import vector_index
+    from benchmarks.dataset import build_catalog
+
+    catalog_path = os.path.join(args.workdir, "catalog.jsonl")
+    total = build_catalog(BACKUP_PATH, args.products, catalog_path)
+    if os.path.exists(f"{catalog_path}.checkpoint"):
+        os.remove(f"{catalog_path}.checkpoint")
+
+    Base.metadata.drop_all(engine)
+    init_db()
+    vector_store.reset_collection()
+    keyword_index.reset()
+    vector_index.reset()
+
+    start = time.perf_counter()
+    imported = import_database(catalog_path, reuse_embeddings=False)
+    elapsed = time.perf_counter() - start
+    return {"products": total, "imported": imported, "seconds": elapsed,
+            "products_per_second": imported / elapsed if elapsed else 0.0}
+
+def recall_at_k(ranked: List[str], relevant: Dict[str, int], k: int) -> float:
+    return len(set(ranked[:k]) & set(relevant)) / len(relevant)
+
+def ndcg_at_k(ranked: List[str], relevant: Dict[str, int], k: int) -> float:
+    dcg = sum((2 ** relevant.get(url, 0) - 1) / math.log2(i + 2) for i, url in enumerate(ranked[:k]))
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** grade - 1) / math.log2(i + 2) for i, grade in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+def evaluate_quality(queries: List[Dict], k: int) -> Dict:
+    """Mean recall@k / nDCG@k for the vector leg, the keyword leg, the fused and the re-ranked result."""
+    from backend import rag
+    from backend.rerank import get_reranker
+    from backend.database import session_scope
+    from backend.models import Product
+
+    with session_scope() as db:
+        urls = dict(db.query(Product.id, Product.product_url))
+        methods = {
+            "vector": lambda q, f: [pid for pid, _ in rag._vector_leg(q, f, k)],
+            "keyword": lambda q, f: [pid for pid, _ in rag._keyword_leg(db, q, f, k)],
+            "hybrid": lambda q, f: [c["product"].id for c in rag.hybrid_search_scored(db, q, f, k)],
+            "reranked": lambda q, f: [c["product"].id for c in
+                                      get_reranker().rerank(q, rag.hybrid_search_scored(db, q, f, k), f)],
+        }
+        results = {}
+        for name, search in methods.items():
+            recalls, ndcgs = [], []
+            for query in queries:
+                ranked = [urls.get(pid) for pid in search(query["query"], query.get("filters", {}))]
+                recalls.append(recall_at_k(ranked, query["relevant"], k))
+                ndcgs.append(ndcg_at_k(ranked, query["relevant"], k))
+            results[name] = {f"recall@{k}": float(np.mean(recalls)), f"ndcg@{k}": float(np.mean(ndcgs))}
+    return results
+
+def measure(fn: Callable[[int], None], iterations: int, warmup: int, concurrency: int) -> Dict:
+    """Call fn(i) `iterations` times on `concurrency` threads; latency percentiles and throughput."""
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+    lock = threading.Lock()
+    counter = count()
+
+    def worker():
+        while True:
+            i = next(counter)
+            if i >= iterations:
+                return
+            start = time.perf_counter()
+            fn(i)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1000
+    return {
+        "iterations": iterations,
+        "throughput_per_second": iterations / wall if wall else 0.0,
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+def measure_latency(args, queries: List[Dict]) -> Dict:
+    from fastapi.testclient import TestClient
+    from backend import rag
+    from backend.database import session_scope
+    from backend.vector_store import query_vector_db
+    from backend.main import app
+
+    texts = [q["query"] for q in queries]
+    filters = [q.get("filters", {}) for q in queries]
+    cursor = {"after": None}
+    results = {}
+
+    def hybrid_search(i):
+        with session_scope() as db:
+            rag.hybrid_search(db, texts[i % len(texts)], filters[i % len(texts)])
+
+    def vector_query(i):
+        query_vector_db(texts[i % len(texts)], n_results=rag.CANDIDATE_LIMIT)
+
+    with TestClient(app) as client:
+        def products_page(i):
+            # Walk the catalog page by page, starting over after the last page
+            params = {"limit": 100}
+            if cursor["after"] is not None:
+                params["after"] = cursor["after"]
+            response = client.get("/products", params=params)
+            response.raise_for_status()
+            cursor["after"] = response.headers.get("x-next-cursor")
+
+        def chat(i):
+            client.post("/chat", json={"query": texts[i % len(texts)]}).raise_for_status()
+
+        for name, fn in (("hybrid_search", hybrid_search), ("query_vector_db", vector_query),
+                         ("GET /products", products_page), ("POST /chat", chat)):
+            results[name] = measure(fn, args.iterations, args.warmup, args.concurrency)
+    return results
+
+def print_report(report: Dict):
+    load = report.get("load")
+    if load:
+        print(f"Loaded {load['imported']} products in {load['seconds']:.1f}s "
+              f"({load['products_per_second']:.0f} products/s)")
+    print(f"\nRetrieval quality ({report['queries']} labeled queries)")
+    for method, scores in report["quality"].items():
+        print(f"  {method:<9} " + "  ".join(f"{name} {value:.3f}" for name, value in scores.items()))
+    print(f"\nLatency (concurrency {report['concurrency']})")
+    print(f"  {'operation':<16}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, stats in report["latency"].items():
+        print(f"  {name:<16}{stats['throughput_per_second']:>9.1f}{stats['p50_ms']:>9.2f}"
+              f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}")
+
+def main():
+    args = parse_args()
+    args.workdir = os.path.abspath(args.workdir)
+    if args.json_path:
+        args.json_path = os.path.abspath(args.json_path)
+    sys.path.insert(0, ROOT)
+    configure_environment(args)
+    install_stubs(args)
+
+    with open(QUERIES_PATH, encoding='utf-8') as f:
+        queries = json.load(f)
+
+    report = {"backend": args.backend, "products": args.products, "concurrency": args.concurrency,
+              "queries": len(queries)}
+    if not args.skip_load:
+        report["load"] = load_catalog(args)
+    report["quality"] = evaluate_quality(queries, args.k)
+    report["latency"] = measure_latency(args, queries)
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Cold-start benchmark: how long a fresh API process takes to import and to become ready.
+
+    python -m benchmarks.startup                   # 5 fresh interpreters
+    python -m benchmarks.startup --runs 10 --backend numpy --json startup.json
+
+Each run starts a new Python process that imports backend.main, enters the
+app lifespan (TestClient) and polls /health/ready until the background
+warm-up is done. Reports the median import time, time to startup complete
+and time to ready, the heavy packages loaded at import (should be none), and
+the slowest imports by cumulative time (python -X importtime). Storage is the
+scratch SQLite database and Chroma directory under --workdir, as in
+benchmarks.run; no network calls are made.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Packages that should load in the warm-up (or never, on the serving path), not at import
+HEAVY_MODULES = ["openai", "chromadb", "firecrawl", "onnxruntime", "tokenizers", "sentence_transformers",
+                 "torch", "tiktoken"]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import backend.main
+imported = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+from fastapi.testclient import TestClient
+with TestClient(backend.main.app) as client:
+    started = time.perf_counter() - start
+    while client.get("/health/ready").status_code != 200:
+        time.sleep(0.005)
+    ready = time.perf_counter() - start
+    warmup = client.get("/health/ready").json()["warmup"]
+print(json.dumps({{"import_seconds": imported, "startup_seconds": started, "ready_seconds": ready,
+                  "heavy_at_import": heavy, "warmup": warmup}}))
+"""
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to time")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy", "pgvector"])
+    parser.add_argument("--database-url", help="defaults to a SQLite file in --workdir")
+    parser.add_argument("--workdir", default=os.path.join(ROOT, "benchmarks", ".work"))
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    return parser.parse_args()
+
+def probe_environment(args) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT,
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(args.workdir, 'bench.db')}",
+        "VECTOR_BACKEND": args.backend,
+        "JOB_EXECUTOR": "thread",
+        "EMBEDDING_CACHE_PATH": "",
+        "LOG_LEVEL": "WARNING",
+    })
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    return env
+
+def run_probe(env: Dict[str, str], workdir: str) -> Dict:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE.format(heavy=HEAVY_MODULES)],
+                            cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    run["imports"] = parse_importtime(result.stderr)
+    return run
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """Top-level package -> cumulative import seconds, from `python -X importtime` output."""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Unindented names are imported directly by the probe (or first by the module that needs them)
+        if name.startswith(" ") and not name.startswith("  "):
+            package = name.strip().split(".")[0]
+            packages[package] = packages.get(package, 0.0) + int(cumulative) / 1e6
+    return packages
+
+def summarize(runs: List[Dict], top: int) -> Dict:
+    imports = {}
+    for run in runs:
+        for package, seconds in run["imports"].items():
+            imports.setdefault(package, []).append(seconds)
+    slowest = sorted(((p, statistics.median(s)) for p, s in imports.items()), key=lambda item: -item[1])
+    return {
+        "runs": len(runs),
+        "import_seconds": statistics.median(r["import_seconds"] for r in runs),
+        "startup_seconds": statistics.median(r["startup_seconds"] for r in runs),
+        "ready_seconds": statistics.median(r["ready_seconds"] for r in runs),
+        "heavy_at_import": sorted({m for r in runs for m in r["heavy_at_import"]}),
+        "slowest_imports": dict(slowest[:top]),
+        "warmup_steps": runs[-1]["warmup"]["steps"],
+    }
+
+def print_report(report: Dict):
+    print(f"Cold start (median of {report['runs']} fresh processes)")
+    print(f"  import backend.main  {report['import_seconds'] * 1000:8.0f} ms")
+    print(f"  startup complete     {report['startup_seconds'] * 1000:8.0f} ms")
+    print(f"  ready                {report['ready_seconds'] * 1000:8.0f} ms")
+    print(f"  heavy packages at import: {', '.join(report['heavy_at_import']) or 'none'}")
+    print("\nSlowest imports (cumulative, includes the probe's fastapi.testclient)")
+    for package, seconds in report["slowest_imports"].items():
+        print(f"  {package:<24}{seconds * 1000:8.0f} ms")
+    print("\nWarm-up steps (last run)")
+    for name, step in report["warmup_steps"].items():
+        status = f"failed: {step['error']}" if step["error"] else ""
+        print(f"  {name:<24}{step['seconds'] * 1000:8.0f} ms  {status}")
+
+def main():
+    args = parse_args()
+    args.workdir = os.path.abspath(args.workdir)
+    os.makedirs(args.workdir, exist_ok=True)
+    env = probe_environment(args)
+    runs = [run_probe(env, args.workdir) for _ in range(args.runs)]
+    report = summarize(runs, args.top)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
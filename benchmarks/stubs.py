@@ -0,0 +1,98 @@
+"""
+Deterministic stand-ins for OpenAI, so benchmarks run with no network.
+
+StubEmbeddingProvider hashes words and word prefixes into a normalized vector:
+texts sharing words land close together, which is enough for retrieval
+quality numbers to move when fusion or indexing changes. The stub LLM
+parses "under/over <price>" for filter extraction and answers chats with
+the product titles it was given. Optional latency simulates API time.
+"""
+import re
+import json
+import time
+import zlib
+import asyncio
+from types import SimpleNamespace
+from typing import List
+import numpy as np
+from backend.embeddings import EmbeddingProvider
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+PRICE_RE = re.compile(r"\b(under|below|less than|over|above|more than)\s*(?:rs\.?|₹)?\s*(\d+)", re.I)
+PREFIX_LENGTH = 5
+
+def stub_embedding(text: str, dim: int) -> List[float]:
+    """Hashed bag of words plus word prefixes (a crude stemmer), L2-normalized."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in WORD_RE.findall(text.lower()):
+        vector[zlib.crc32(word.encode()) % dim] += 1.0
+        if len(word) > PREFIX_LENGTH:
+            vector[zlib.crc32(b"prefix:" + word[:PREFIX_LENGTH].encode()) % dim] += 0.5
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector.tolist()
+
+class StubEmbeddingProvider(EmbeddingProvider):
+    model = "stub-hashed-words"
+
+    def __init__(self, dim: int, latency: float = 0.0):
+        self.dim, self.latency = dim, latency
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [stub_embedding(text, self.dim) for text in texts]
+
+def _usage(messages, answer: str) -> SimpleNamespace:
+    prompt = sum(len(m["content"].split()) for m in messages)
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=len(answer.split()),
+                           total_tokens=prompt + len(answer.split()))
+
+def extract_filters(query: str) -> dict:
+    filters = {}
+    for word, amount in PRICE_RE.findall(query):
+        key = "max_price" if word.lower() in ("under", "below", "less than") else "min_price"
+        filters[key] = float(amount)
+    return {"query": PRICE_RE.sub("", query).strip() or query, "filters": filters}
+
+def _answer(messages) -> str:
+    titles = re.findall(r"\*\*(.+?)\*\*", messages[-1]["content"])
+    return "Here are some great picks: " + ", ".join(titles) + "."
+
+def _completion(messages, response_format=None) -> SimpleNamespace:
+    if response_format is not None:
+        query = re.search(r'Analyze the user query: "(.*)"', messages[-1]["content"]).group(1)
+        content = json.dumps(extract_filters(query))
+    else:
+        content = _answer(messages)
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                           usage=_usage(messages, content))
+
+class _Completions:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def create(self, model, messages, response_format=None, **kwargs):
+        time.sleep(self.latency)
+        return _completion(messages, response_format)
+
+class _AsyncCompletions(_Completions):
+    async def create(self, model, messages, response_format=None, stream=False, **kwargs):
+        await asyncio.sleep(self.latency)
+        completion = _completion(messages, response_format)
+        if not stream:
+            return completion
+        return _stream(completion.choices[0].message.content, completion.usage)
+
+async def _stream(content: str, usage):
+    for word in content.split(" "):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))], usage=None)
+    yield SimpleNamespace(choices=[], usage=usage)
+
+def stub_openai(llm_latency: float = 0.0) -> SimpleNamespace:
+    """Object with the `openai` module surface rag.py uses (chat.completions)."""
+    return SimpleNamespace(chat=SimpleNamespace(completions=_Completions(llm_latency)))
+
+def stub_async_client(llm_latency: float = 0.0) -> SimpleNamespace:
+    """Stand-in for openai.AsyncOpenAI."""
+    return SimpleNamespace(chat=SimpleNamespace(completions=_AsyncCompletions(llm_latency)))
@@ -1,6 +1,5 @@
 import { useState, useRef, useEffect } from 'react'
 import { Link } from 'react-router-dom'
-import axios from 'axios'
 import './ChatInterface.css'
 
 const API_URL = 'https://neusearch-backend-x9lv.onrender.com'
@@ -31,13 +30,52 @@ function ChatInterface() {
         setLoading(true)
 
         try {
-            const response = await axios.post(`${API_URL}/chat`, { query: userMessage })
+            const response = await fetch(`${API_URL}/chat/stream`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ query: userMessage })
+            })
+            if (!response.ok || !response.body) {
+                throw new Error(`Request failed: ${response.status}`)
+            }
 
-            setMessages(prev => [...prev, {
-                role: 'assistant',
-                content: response.data.response,
-                products: response.data.products
-            }])
+            // Products arrive first, then the answer streams in token by token
+            const appendToAnswer = (text) => {
+                setMessages(prev => {
+                    const next = [...prev]
+                    const last = next[next.length - 1]
+                    next[next.length - 1] = { ...last, content: last.content + text }
+                    return next
+                })
+            }
+
+            const reader = response.body.getReader()
+            const decoder = new TextDecoder()
+            let buffer = ''
+            while (true) {
+                const { value, done } = await reader.read()
+                if (done) break
+                buffer += decoder.decode(value, { stream: true })
+
+                const events = buffer.split('\n\n')
+                buffer = events.pop()
+                for (const raw of events) {
+                    const eventLine = raw.split('\n').find(line => line.startsWith('event: '))
+                    const dataLine = raw.split('\n').find(line => line.startsWith('data: '))
+                    if (!eventLine || !dataLine) continue
+                    const event = eventLine.slice(7)
+                    const data = JSON.parse(dataLine.slice(6))
+
+                    if (event === 'products') {
+                        setLoading(false)
+                        setMessages(prev => [...prev, { role: 'assistant', content: '', products: data }])
+                    } else if (event === 'token') {
+                        appendToAnswer(data.content)
+                    } else if (event === 'error') {
+                        throw new Error(data.detail)
+                    }
+                }
+            }
         } catch (error) {
             console.error('Error:', error)
             setMessages(prev => [...prev, {
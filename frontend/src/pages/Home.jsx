@@ -17,7 +17,9 @@ function Home() {
 
     const fetchProducts = async () => {
         try {
-            const response = await axios.get(`${API_URL}/products`)
+            const response = await axios.get(`${API_URL}/products`, {
+                params: { fields: 'id,title,price,category,image_url' }
+            })
             setProducts(response.data)
         } catch (error) {
             console.error('Error fetching products:', error)
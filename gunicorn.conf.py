@@ -0,0 +1,16 @@
+"""Gunicorn settings for `gunicorn backend.main:app` (see backend/serve.py)."""
+import os
+from backend import serve
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = serve.WEB_CONCURRENCY
+worker_class = "uvicorn.workers.UvicornWorker"
+# Import the app and build the indexes once in the master, then fork the workers
+preload_app = True
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+when_ready = serve.when_ready
+post_fork = serve.post_fork
+on_exit = serve.on_exit
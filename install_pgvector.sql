@@ -1,2 +1,14 @@
 -- Run this in pgAdmin to install pgvector
 CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Storage and indexes for VECTOR_BACKEND=pgvector
+-- (python -m backend.init_db runs the same statements when that backend is enabled)
+ALTER TABLE products ADD COLUMN IF NOT EXISTS embedding_vector vector(1536);
+CREATE INDEX IF NOT EXISTS products_embedding_hnsw ON products
+    USING hnsw (embedding_vector vector_cosine_ops);
+CREATE INDEX IF NOT EXISTS products_search_tsv ON products
+    USING gin ((to_tsvector('english', coalesce(products.title, '') || ' ' || coalesce(products.description, ''))));
+
+-- Backfill from the JSON embeddings already stored by the app
+UPDATE products SET embedding_vector = embedding::text::vector
+    WHERE embedding IS NOT NULL AND json_typeof(embedding) = 'array' AND embedding_vector IS NULL;